@@ -0,0 +1,132 @@
+#!/usr/bin/env python2
+"""Write text output files from a background thread so disk stalls never hold up the display loop."""
+# AsyncWriter.py
+#
+# Created 10/18/26 - queued, batched file writer with a flush/fsync policy
+# Updated 10/18/26 - a writer stays on the exit list until its worker has written everything, even after close(wait=False)
+
+import atexit
+import os
+import threading
+from six.moves import queue
+
+_CLOSE = object() # queued to stop the worker
+_openWriters = set() # writers whose worker is still running, joined at exit so nothing queued is lost on core.quit()
+
+
+class AsyncWriter(object):
+    """File-like object whose write() only queues the text; a worker thread writes it out in batches.
+
+    Each batch (everything queued since the last one, up to batchSize writes) goes to the file in one write call. With
+    the default policy every batch is flushed to the OS, so a crash of the script loses at most the batch in flight;
+    set fsync to also force it to disk, which survives a crash of the PC too.
+
+    Args:
+        fileName (str): file to write
+        mode (str): open mode; default 'w'
+        batchSize (int): most queued writes to combine into one batch; default 256
+        flushEvery (int): flush after every flushEvery batches (0 = only on flush() and close()); default 1
+        fsync (bool): os.fsync after each flush; default False
+    """
+
+    def __init__(self, fileName, mode='w', batchSize=256, flushEvery=1, fsync=False):
+        self.name = fileName
+        self.batchSize = batchSize
+        self.flushEvery = flushEvery
+        self.fsync = fsync
+        self.closed = False
+        self.error = None # exception raised by the worker, re-raised on the next write/flush/close
+        self._file = open(fileName, mode)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._Run, name='AsyncWriter %s' % fileName)
+        self._thread.daemon = True
+        self._thread.start()
+        _openWriters.add(self)
+
+    def write(self, text):
+        """Queue text to be written."""
+        self._CheckError()
+        self._queue.put(text)
+
+    def writelines(self, lines):
+        self.write(''.join(lines))
+
+    def flush(self):
+        """Wait until everything queued so far is written and flushed (don't call this in a timing-critical loop)."""
+        self._CheckError()
+        done = _FlushRequest()
+        self._queue.put(done)
+        done.event.wait()
+        self._CheckError()
+
+    def close(self, wait=True):
+        """Write out everything queued and close the file. With wait=False, return at once and let the worker finish."""
+        if not self.closed:
+            self.closed = True
+            self._queue.put(_CLOSE) # the worker leaves _openWriters once it has written everything
+        if wait:
+            self._thread.join()
+            self._CheckError()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _CheckError(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _Flush(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _Run(self):
+        try:
+            self._Write()
+        finally:
+            _openWriters.discard(self)
+
+    def _Write(self):
+        nBatches = 0
+        closing = False
+        while not closing:
+            # take everything that's waiting, up to batchSize writes
+            items = [self._queue.get()]
+            try:
+                while len(items) < self.batchSize and items[-1] is not _CLOSE:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            texts = [item for item in items if item is not _CLOSE and not isinstance(item, _FlushRequest)]
+            flushRequests = [item for item in items if isinstance(item, _FlushRequest)]
+            closing = items[-1] is _CLOSE
+            try:
+                if texts:
+                    self._file.write(''.join(texts))
+                    nBatches += 1
+                if flushRequests or closing or (texts and self.flushEvery and nBatches % self.flushEvery == 0):
+                    self._Flush()
+                if closing:
+                    self._file.close()
+            except (IOError, OSError) as e:
+                self.error = e
+            for done in flushRequests:
+                done.event.set()
+
+
+class _FlushRequest(object):
+    # queued by flush(); the worker sets the event once everything before it is flushed
+    def __init__(self):
+        self.event = threading.Event()
+
+
+# close any writers still open, and wait for those already closed with wait=False, when the script exits (e.g. through
+# core.quit())
+def _CloseAll():
+    for writer in list(_openWriters):
+        writer.close()
+atexit.register(_CloseAll)
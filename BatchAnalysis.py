@@ -0,0 +1,135 @@
+#!/usr/bin/env python2
+"""Recompute anticipation ratings for every session log in a folder and combine them into one table."""
+# BatchAnalysis.py
+#
+# Created 10/18/26 - parallel per-session analysis of GalbraithHeat logs, cached by log hash
+# Updated 10/18/26 - cache files are written to a temporary name and moved into place, so they're never half-written
+
+import glob
+import hashlib
+import multiprocessing
+import os
+import re
+import numpy as np
+import LogParser
+import SliderData
+
+
+CACHE_VERSION = 1 # bump when AnalyzeLog changes so cached results are recomputed
+TRIAL_DTYPE = np.dtype([('subject', 'S16'), ('session', 'S16'), ('block', 'i2'), ('trial', 'i2'), ('color', 'i1'),
+                        ('colorName', 'S8'), ('size', 'i1'), ('avgRate', 'f8'), ('loggedAvgRate', 'f8')])
+CIRCLE_RE = re.compile(r'.*[\\/](\d)(\w*?)_(\d)\.\w+$') # e.g. Circles\3Red_1.JPG
+FILENAME_RE = re.compile(r'GalbraithHeat\w*-([^-]+)-([^-]+)-') # GalbraithHeat-<subject>-<session>-<date>.log
+
+
+# Hash of a log file's contents, used as its cache key
+def HashFile(fileName):
+    sha = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# --- ANALYZE ONE SESSION --- #
+# Returns a TRIAL_DTYPE array with one row per circle trial: the trial's average rating, recomputed from its logged
+# slider history with the same integration as integrateData (SliderData.TrialAverage), and the average the task logged.
+def AnalyzeLog(fileName):
+    parsed = LogParser.ParseLog(fileName)
+    params = parsed['params']
+    match = FILENAME_RE.match(os.path.basename(fileName))
+    subject = str(params.get('subject', match.group(1) if match else ''))
+    session = str(params.get('session', match.group(2) if match else ''))
+
+    loggedAvgRates = {} # (block, name) -> avgRates logged for that image in that block, in order
+    for row in parsed['avgRates']:
+        loggedAvgRates.setdefault((row['block'], row['name']), []).append(row['avgRate'])
+
+    rows = []
+    trialInBlock = {}
+    for iHistory, row in enumerate(parsed['histories']):
+        name = row['name'].decode() if isinstance(row['name'], bytes) else row['name']
+        circle = CIRCLE_RE.match(name)
+        if not circle: # block-level and VAS histories
+            continue
+        block = int(row['block'])
+        trialInBlock[block] = trialInBlock.get(block, 0) + 1
+        logged = loggedAvgRates.get((row['block'], row['name']), [])
+        rows.append((subject, session, block, trialInBlock[block], int(circle.group(1)), circle.group(2),
+                     int(circle.group(3)), SliderData.TrialAverage(LogParser.GetHistory(parsed, iHistory)),
+                     logged.pop(0) if logged else np.nan))
+    return np.array(rows, dtype=TRIAL_DTYPE)
+
+def _AnalyzeCached(job):
+    # run in a worker process: analyze one log and save the result under its hash
+    fileName, cacheFile = job
+    trials = AnalyzeLog(fileName)
+    # write to a temporary file first, then move it into place, so an interrupted save never leaves a truncated entry
+    tmpName = '%s.%d.tmp.npy' % (cacheFile[:-4], os.getpid())
+    np.save(tmpName, trials)
+    if hasattr(os, 'replace'): # python 3: atomic, even on Windows
+        os.replace(tmpName, cacheFile)
+    else:
+        try:
+            os.rename(tmpName, cacheFile)
+        except OSError: # on Windows, another process already cached the same log
+            os.remove(tmpName)
+    return trials
+
+
+# --- ANALYZE A FOLDER OF SESSIONS --- #
+# Analyze every log matching pattern in logDir, reusing results cached (by log contents) in cacheDir, so only new or
+# changed logs are parsed. New logs are analyzed in parallel on nProcesses worker processes (default: one per core).
+# Returns the combined trial table of all sessions. On Windows, call this under "if __name__ == '__main__':".
+def AnalyzeDirectory(logDir, pattern='GalbraithHeat-*.log', cacheDir=None, nProcesses=None):
+    if cacheDir is None:
+        cacheDir = os.path.join(logDir, 'analysisCache')
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+
+    fileNames = sorted(glob.glob(os.path.join(logDir, pattern)))
+    cacheFiles = [os.path.join(cacheDir, '%s-v%d.npy' % (HashFile(fileName), CACHE_VERSION)) for fileName in fileNames]
+    jobs = [(fileName, cacheFile) for (fileName, cacheFile) in zip(fileNames, cacheFiles) if not os.path.exists(cacheFile)]
+    print('%d sessions, %d cached, %d to analyze' % (len(fileNames), len(fileNames) - len(jobs), len(jobs)))
+    if len(jobs) > 1 and nProcesses != 1:
+        pool = multiprocessing.Pool(nProcesses)
+        try:
+            pool.map(_AnalyzeCached, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            _AnalyzeCached(job)
+
+    tables = [np.load(cacheFile) for cacheFile in cacheFiles]
+    return np.concatenate(tables) if tables else np.zeros(0, dtype=TRIAL_DTYPE)
+
+# Average avgRate over the trials in each group of the fields in by (e.g. ('subject', 'color', 'size'))
+# and return the groups (a structured array) and their mean ratings and trial counts
+def Summarize(trials, by=('subject', 'color', 'size')):
+    groups, iGroup = np.unique(trials[list(by)], return_inverse=True)
+    iGroup = iGroup.reshape(-1)
+    counts = np.bincount(iGroup, minlength=len(groups))
+    means = np.bincount(iGroup, weights=trials['avgRate'], minlength=len(groups)) / np.maximum(counts, 1)
+    return groups, means, counts
+
+# Write a structured array to a csv file with a header row
+def WriteTable(fileName, table):
+    with open(fileName, 'w') as f:
+        f.write(','.join(table.dtype.names) + '\n')
+        for row in table.tolist():
+            f.write(','.join([value.decode() if isinstance(value, bytes) else str(value) for value in row]) + '\n')
+
+
+if __name__ == '__main__':
+    import sys
+    logDir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    outFile = sys.argv[2] if len(sys.argv) > 2 else os.path.join(logDir, 'anticipationTrials.csv')
+    trials = AnalyzeDirectory(logDir)
+    WriteTable(outFile, trials)
+    print('wrote %d trials to %s' % (len(trials), outFile))
+    groups, means, counts = Summarize(trials)
+    for group, mean, count in zip(groups.tolist(), means, counts):
+        print('subject %s, color %d, size %d: %.3f (%d trials)' % (group[0].decode() if isinstance(group[0], bytes) else group[0],
+                                                                   group[1], group[2], mean, count))
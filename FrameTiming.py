@@ -0,0 +1,226 @@
+#!/usr/bin/env python2
+"""Record flip times and report dropped frames and late onsets per trial."""
+# FrameTiming.py
+#
+# Created 10/18/26 - flip-time capture into a preallocated array, per-trial frame statistics, frame budget warning
+# Updated 10/18/26 - StepTrajectory and FrameAnimation for animations locked to flip times
+# Updated 10/18/26 - WaitUntil: sleep until just before a deadline, then spin, checking for escape at a bounded rate
+# Updated 10/18/26 - OnsetReport: planned vs achieved onsets of a block; NextRefresh to put a time on the refresh grid
+# Updated 10/18/26 - FlipRecorder keeps running per-trial counts, and the flip times of the current block only
+
+import time
+import numpy as np
+
+
+FRAME_DTYPE = np.dtype([('name', 'S64'), ('tOnset', 'f8'), ('onsetError', 'f8'), ('nFrames', 'i4'), ('nLate', 'i4'),
+                        ('maxInterval', 'f8')])
+
+
+class FlipRecorder(object):
+    """Capture the block's flip times into a preallocated array and summarize the frames of each trial as they come.
+
+    A frame is late when the interval since the previous flip is over lateFactor refresh periods (i.e. at least one
+    refresh was dropped). The onset error is the time of the trial's first flip minus the time it was scheduled for.
+    Trial statistics are kept as running counts; the flip times (Times()) are for saving with the block, so they can be
+    checked after the session. StartBlock() empties the array in place, so memory doesn't grow with the session.
+
+    Args:
+        frameDur (float): refresh period in seconds (1/measured frame rate)
+        capacity (int): flip times to keep per block; flips past it are counted but not kept (warned once)
+        lateFactor (float): interval, in refresh periods, above which a frame counts as late; default 1.5
+        budget (int): warn as soon as a trial has more late frames than this; default None (no warning)
+        logging (module): psychopy logging module for the per-trial DATA lines and warnings; default None (print only)
+    """
+
+    def __init__(self, frameDur, capacity=131072, lateFactor=1.5, budget=None, logging=None):
+        self.frameDur = frameDur
+        self.lateFactor = lateFactor
+        self.budget = budget
+        self.logging = logging
+        self.times = np.empty(capacity) # this block's flip times
+        self.nTimes = 0 # flips of this block (may exceed len(times))
+        self.nFlips = 0
+        self.tLast = None # time of the last flip
+        self.trials = [] # FRAME_DTYPE rows, one per finished trial
+        self._trial = None # (name, scheduled onset)
+        self._tOnset = np.nan # this trial's first flip
+        self._nFrames = 0 # flips so far in this trial
+        self._nLate = 0 # late frames so far in this trial
+        self._maxInterval = np.nan # longest interval so far in this trial, including the one into its first flip
+        self._warned = False
+
+    def Record(self, tFlip):
+        """Record a flip (call right after win.flip(), with the time it returned)."""
+        if self.nTimes < len(self.times):
+            self.times[self.nTimes] = tFlip
+        elif self.nTimes == len(self.times):
+            self._Log('WARNING', 'more than %d flips this block: later flip times are not kept' % len(self.times))
+        self.nTimes += 1
+        if self._trial is not None:
+            if self._nFrames == 0:
+                self._tOnset = tFlip
+            self._nFrames += 1
+            if self.tLast is not None:
+                interval = tFlip - self.tLast
+                if not interval <= self._maxInterval: # also true while it's nan
+                    self._maxInterval = interval
+                if interval > self.lateFactor * self.frameDur:
+                    self._nLate += 1
+                    if self.budget is not None and not self._warned and self._nLate > self.budget:
+                        self._warned = True
+                        self._Log('WARNING', 'frame budget exceeded in %s: %d late frames' % (self._trial[0],
+                                                                                           self._nLate))
+        self.tLast = tFlip
+        self.nFlips += 1
+
+    def StartBlock(self):
+        """Start keeping flip times from the beginning of the array again (save Times() first)."""
+        self.nTimes = 0
+
+    def Times(self):
+        """Return the flip times kept since StartBlock (a view into the array, valid until the next StartBlock)."""
+        return self.times[:min(self.nTimes, len(self.times))]
+
+    def StartTrial(self, name, tScheduled=None):
+        """Start a trial whose first flip is the next one recorded, scheduled for tScheduled (e.g. tNextFlip[0])."""
+        self._trial = (name, tScheduled)
+        self._tOnset = np.nan
+        self._nFrames = 0
+        self._nLate = 0
+        self._maxInterval = np.nan
+        self._warned = False
+
+    def EndTrial(self):
+        """Finish the current trial, log its frame statistics and return them as a FRAME_DTYPE row (tuple)."""
+        if self._trial is None:
+            return None
+        name, tScheduled = self._trial
+        self._trial = None
+        onsetError = self._tOnset - tScheduled if tScheduled is not None else np.nan
+        row = (name, self._tOnset, onsetError, self._nFrames, self._nLate, self._maxInterval)
+        self.trials.append(row)
+        self._Log('DATA', 'frames %s: %d frames, %d late, max interval %.1f ms, onset error %.1f ms' % (
+            name, self._nFrames, self._nLate, self._maxInterval * 1000, onsetError * 1000))
+        return row
+
+    def NextRefresh(self, t):
+        """Return the first refresh at or after t, extrapolated from the last recorded flip (t itself if none yet)."""
+        if self.tLast is None:
+            return t
+        return self.tLast + max(np.ceil((t - self.tLast) / self.frameDur), 0) * self.frameDur
+
+    def Stats(self, iStart=0):
+        """Return the statistics of the finished trials from number iStart on (default all) as a FRAME_DTYPE array."""
+        return np.array(self.trials[iStart:], dtype=FRAME_DTYPE)
+
+    def _Log(self, level, msg):
+        if level == 'WARNING':
+            print(msg)
+        if self.logging is not None:
+            self.logging.log(level=getattr(self.logging, level), msg=msg)
+
+
+# Size (or any value) at each frame of an animation that steps by stepSize every stepDur seconds for nSteps steps,
+# sampled at frameRate: element i is the value to show on the i-th flip after onset, and the last element is reached
+# exactly nSteps*stepDur after onset.
+def StepTrajectory(start, stepSize, nSteps, stepDur, frameRate):
+    stepFrames = np.round(np.arange(1, nSteps + 1) * stepDur * frameRate) # frame on which each step appears
+    iStep = np.searchsorted(stepFrames, np.arange(stepFrames[-1] + 1), side='right') # steps taken by each frame
+    return start + stepSize * iStep
+
+
+class FrameAnimation(object):
+    """Play a precomputed per-frame trajectory locked to flip times rather than to a count of flips.
+
+    The frame to draw next is taken from the time of the last flip, so a dropped refresh skips ahead instead of
+    stretching the animation, and the last value is shown len(values)-1 frames after onset. Skipped frames whose value
+    differs from the one before them (a target size that never appeared on time) are counted as missed.
+
+    Args:
+        values (array): value to show on each frame after onset (e.g. from StepTrajectory)
+        frameDur (float): refresh period in seconds (1/measured frame rate)
+        logging (module): psychopy logging module for the summary line; default None (don't log)
+    """
+
+    def __init__(self, values, frameDur, logging=None):
+        self.values = np.asarray(values)
+        self.frameDur = frameDur
+        self.logging = logging
+        self.nFrames = len(self.values) - 1 # index of the last frame
+        self.tOnset = None
+        self.iFrame = -1 # frame shown on the last flip
+        self.nSkipped = 0
+        self.missed = [] # indices of skipped frames whose value changed
+
+    def Start(self, tOnset):
+        """Set the time of the flip that showed frame 0 (values[0])."""
+        self.tOnset = tOnset
+        self.iFrame = 0
+        self.nSkipped = 0
+        self.missed = []
+
+    def Next(self, tFlip):
+        """Return the index of the frame to draw for the flip after the one at tFlip, or None when the animation is done."""
+        if self.iFrame >= self.nFrames:
+            return None
+        iNext = min(max(int(round((tFlip - self.tOnset) / self.frameDur)) + 1, self.iFrame + 1), self.nFrames)
+        if iNext > self.iFrame + 1:
+            skipped = np.arange(self.iFrame + 1, iNext)
+            self.nSkipped += len(skipped)
+            self.missed.extend(skipped[self.values[skipped] != self.values[skipped - 1]].tolist())
+        self.iFrame = iNext
+        return iNext
+
+    def Report(self, name='animation'):
+        """Log and return a one-line summary of skipped frames and missed values."""
+        line = '%s: %d frames, %d skipped, %d target values missed%s' % (
+            name, self.nFrames + 1, self.nSkipped, len(self.missed),
+            ' (frames %s)' % self.missed[:10] if self.missed else '')
+        if self.missed:
+            print(line)
+        if self.logging is not None:
+            self.logging.log(level=self.logging.DATA, msg=line)
+        return line
+
+
+# Wait until getTime() reaches tDeadline without holding a core the whole time: sleep in steps until margin seconds
+# before the deadline, then spin for the rest. checkEscape (e.g. a function that quits on 'q'/'escape') is called at
+# most once per checkInterval while sleeping, and not at all during the final spin. The margin has to cover the
+# sleep overshoot of the OS: about 1 ms with a 1 ms timer resolution, up to 16 ms on Windows without it.
+# Returns how late the wait ended (s).
+def WaitUntil(tDeadline, getTime, margin=0.002, checkInterval=0.05, checkEscape=None):
+    tNow = getTime()
+    tCheck = tNow # check right away
+    while tDeadline - tNow > margin:
+        if checkEscape is not None and tNow >= tCheck:
+            checkEscape()
+            tCheck = tNow + checkInterval
+        tWake = tDeadline - margin
+        if checkEscape is not None:
+            tWake = min(tWake, tCheck)
+        time.sleep(max(tWake - tNow, 0.))
+        tNow = getTime()
+    while tNow < tDeadline:
+        tNow = getTime()
+    return tNow - tDeadline
+
+
+# Log (at DATA level, if a psychopy logging module is given) the planned and achieved onset of each stimulus of a block,
+# in s from the block anchor, and a summary line, which is also printed. Returns the onset errors in frames.
+def OnsetReport(block, names, planned, achieved, frameDur, logging=None):
+    planned = np.asarray(planned, dtype=float)
+    achieved = np.asarray(achieved, dtype=float)
+    errors = (achieved - planned) / frameDur
+    lines = ['onset block %d %s: planned %.4f, achieved %.4f, error %.1f ms (%+d frames)' % (
+        block, name, tPlanned, tAchieved, error * frameDur * 1000, int(round(error)))
+        for (name, tPlanned, tAchieved, error) in zip(names, planned, achieved, errors)]
+    if len(errors):
+        summary = 'onsets block %d: %d stimuli, mean error %.1f ms, max %.1f ms, %d off by a frame or more' % (
+            block, len(errors), errors.mean() * frameDur * 1000, np.abs(errors).max() * frameDur * 1000,
+            np.count_nonzero(np.abs(np.round(errors)) >= 1))
+        print(summary)
+        lines.append(summary)
+    if logging is not None:
+        for line in lines:
+            logging.log(level=logging.DATA, msg=line)
+    return errors
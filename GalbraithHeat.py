@@ -8,31 +8,56 @@
 # Updated 7/29/20 by DJ - added VAS that's persistent throughout block, fixed color order, removed trial responses, simplified params
 # Updated 8/20/20 by JG - created functions for output
 # Updated 8/31/20 by JG - changed visuals, added heat input, added VAS pre, mid, post, modified instructions to start over
-
-
-from psychopy import core, gui, data, event, sound, logging 
-import pandas as pd
+# Updated 10/18/26 - heat is pre-armed during the anticipation circles and triggered on schedule by HeatScheduler
+# Updated 10/18/26 - temperature -> medoc code table is cached by TempConv instead of read with pandas every run
+# Updated 10/18/26 - only import what the run needs (medoc/port modules on demand), time each startup phase
+# Updated 10/18/26 - trial averages come from a running TrialIntegrator instead of re-slicing the slider history
+# Updated 10/18/26 - slider history is resampled with SliderData.ResampleIndex; grid step set by resampleStep
+# Updated 10/18/26 - anxSlider samples are copied into a SliderBuffer; averages, resampling and logs read slices of it
+# Updated 10/18/26 - uniform anxSlider signal sampled every frame (or sliderSampleRate) and saved to a csv per block
+# Updated 10/18/26 - data files are written by AsyncWriter threads so disk stalls can't delay the next flip
+# Updated 10/18/26 - trials, slider samples, port and heat events saved as .npy files by SessionStore at each block end
+# Updated 10/18/26 - held slider keys are handled per frame by RatingScales.HeldKeySlider instead of the blocking KeyHold loop
+# Updated 10/18/26 - every flip time is recorded by FrameTiming.FlipRecorder; late frames and onset error saved per trial
+# Updated 10/18/26 - all images are preloaded into a StimCache at startup; trials swap stims instead of calling setImage
+# Updated 10/18/26 - WaitForFlipTime sleeps until just before the deadline (FrameTiming.WaitUntil); flip loops stop a frame early
+# Updated 10/18/26 - whole session schedule (images, durations, port and heat codes) built by Timeline and saved before the run
+# Updated 10/18/26 - onsets scheduled in whole frames from a block anchor; planned vs achieved onsets reported per block
+# Updated 10/18/26 - end-of-block files are written while the between-block message waits, only the block's own data
+# Updated 10/18/26 - slider history kept with globalClock times, like the uniform slider signal
+# Updated 10/18/26 - trial averages restart at each block start instead of integrating the pause between blocks
+# Updated 10/18/26 - flip times are the timestamps win.flip() returns, converted to globalClock
+# Updated 10/18/26 - each block's flip times saved with its slider data (flips-block<k>.npy)
+# Updated 10/18/26 - the stimulus onset flip records the slider and held keys like every other frame
+
+
+import time as ts # for timing
+tScriptStart = ts.time() # for startup timing
+import StartupProfiler
+startupProfiler = StartupProfiler.StartupProfiler(tScriptStart)
+startupProfiler.Start('imports')
+from psychopy import core, gui, event, logging 
 # from psychopy import visual # visual causes a bug in the guis, so it's declared after all GUIs run.
 from psychopy.tools.filetools import fromFile, toFile # saving and loading parameter files
-import time as ts, numpy as np # for timing and array operations
-from scipy.integrate import simps
-from numpy import trapz
+import numpy as np # for array operations
 import os, glob
 #import AppKit, os, glob # for monitor size detection, files - could not import on windows
 import BasicPromptTools # for loading/presenting prompts and questions
 import RatingScales
+import SliderData
+import AsyncWriter
+import SessionStore
+import FrameTiming
+import Timeline
 import random # for randomization of trials
-import string
-import math
-import socket
-import devices
-from devices import Pathway
+# medoc modules (devices, HeatScheduler, TempConv) are imported below only if params['useMedoc'] is set
 
 
 
 # ====================== #
 # ===== PARAMETERS ===== #
 # ====================== #
+startupProfiler.Start('params')
 # Save the parameters declared below?
 saveParams = False;
 newParamsFilename = 'GalbraithHeatParams.psydat'
@@ -46,6 +71,7 @@ params = {
     'painDur': 10,             # time of heat sensation (in seconds)
     'ISI': 0,                 # time between when one stimulus disappears and the next appears (in seconds)
     'tStartup': 5,            # pause time before starting first stimulus
+    'minLeadIn': 1.0,         # shortest time from the start of a block to its first stimulus (in seconds)
     'imageDir': 'Circles/',   # directory containing image stimluli
     'imageSuffix': '.JPG',    # images will be selected randomly (without replacement) from all files in imageDir that end in imageSuffix.
     'pracDir':'PracticeSquares/',    #directory containing practice squares
@@ -58,6 +84,13 @@ params = {
     'questionUpKey':'2',      # move slider right
     'questionDur': 999.0,
     'vasStepSize': 0.5,       # how far the slider moves with a keypress (increase to move faster)
+    'resampleStep': 0.5,      # grid step (in seconds) of the slider ratings written to the avg file at the end of each block
+    'sliderSampleRate': 0,    # rate (in Hz) of the uniform slider signal saved for each block (0 = every frame)
+    'outputFlushEvery': 1,    # data files are written in the background; flush every this many batches (0 = only at the end)
+    'outputFsync': False,     # also force each flush to disk (slower, but survives a crash of the PC)
+    'frameBudget': 2,         # warn during the run when a trial has more late (dropped) frames than this (None = no warning)
+    'waitMargin': 0.002,      # waits sleep until this long before the deadline, then spin (in seconds; ~0.016 if the OS timer is coarse)
+    'escapeCheckInterval': 0.05, # how often waits check for the escape keys (in seconds)
     'textColor':(0,0,0),      # black in rgb255 space or gray in rgb space
     'PreVasMsg': "Let's do some rating scales.",             # Text shown BEFORE each VAS except the final one
     'introPractice': 'Questions/PracticeRating.txt', #Name of text file containing practice rating scales
@@ -80,6 +113,11 @@ params = {
     'portAddress': 0xE050,  # 0xE050,  0x0378,  address of parallel port
     'codeBaseline': 144,     # parallel port code for baseline period 
     'convExcel': 'tempConv.xlsx',  #excel file with temp to binary code mappings
+# medoc parameters
+    'useMedoc': False,       # deliver heat with the Medoc Pathway thermode
+    'medocIP': '10.150.254.8', # ip address of the Medoc host computer
+    'medocPort': 20121,      # port the Medoc host computer is listening on
+    'heatDelay': 0.0,        # time from full-size circle onset to heat TRIGGER (in seconds)
 
 }
 
@@ -96,6 +134,7 @@ if saveParams:
 # ========================== #
 # ===== SET UP LOGGING ===== #
 # ========================== #
+startupProfiler.Start('dialogs')
 scriptName = os.path.basename(__file__)
 scriptName = os.path.splitext(scriptName)[0] #% remove extension
 try: # try to get a previous parameters file
@@ -147,6 +186,7 @@ print '}'
 toFile('%s-lastExpInfo.psydat'%scriptName, expInfo)#save params to file for next time
 
 #make a log file to save parameter/event  data
+startupProfiler.Start('logging')
 dateStr = ts.strftime("%b_%d_%H%M", ts.localtime()) # add the current time
 filename = '%s-%s-%d-%s'%(scriptName,expInfo['subject'], expInfo['session'], dateStr) # log filename
 logging.LogFile((filename+'.log'), level=logging.INFO)#, mode='w') # w=overwrite
@@ -186,6 +226,7 @@ screenRes = [1024,768]
 # == SET UP PARALLEL PORT AND MEDOC == #
 # ==================================== #
 #
+startupProfiler.Start('devices')
 if params['sendPortEvents']:
     from psychopy import parallel
     port = parallel.ParallelPort(address=params['portAddress'])
@@ -194,17 +235,24 @@ else:
     print("Parallel port not used.")
 
 
-#my_pathway = Pathway(ip='10.150.254.8',port_number=20121)
-
-#Check status of medoc connection
-#response = my_pathway.status()
-#print(response)
+if params['useMedoc']:
+    from devices import Pathway
+    import TempConv # for temperature -> medoc code lookups
+    tempCodes = TempConv.LoadTempCodes(params['convExcel']) # cached, only reads the spreadsheet when it changes
+    # keep one connection open and watch the device state in the background
+    my_pathway = Pathway(ip=params['medocIP'],port_number=params['medocPort'],reuse_socket=True)
+    my_pathway.start_monitor()
+    #Check status of medoc connection
+    print(my_pathway.status())
+else:
+    print("Medoc not used.")
 
 
 
 # ========================== #
 # ===== SET UP STIMULI ===== #
 # ========================== #
+startupProfiler.Start('window')
 from psychopy import visual
 
 # Initialize deadline for displaying next frame
@@ -212,7 +260,15 @@ tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python vari
 
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
+flipClockOffset = globalClock.getTime() - logging.defaultClock.getTime() # win.flip() returns its time on logging.defaultClock; add this to get globalClock time
+if params['useMedoc']:
+    import HeatScheduler
+    heatScheduler = HeatScheduler.HeatScheduler(my_pathway, globalClock) # programs/starts heat ahead of time, triggers on schedule
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+frameRate = win.getActualFrameRate() or 60.0 # measured refresh rate (Hz); assume 60 if it can't be measured
+logging.log(level=logging.INFO, msg='frame rate: %.2f Hz'%frameRate)
+flipRecorder = FrameTiming.FlipRecorder(1.0/frameRate, budget=params['frameBudget'], logging=logging) # flip times per block, frame statistics per trial
+startupProfiler.Start('stimuli')
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -222,10 +278,12 @@ message1 = visual.TextStim(win, pos=[0,+.5], wrapWidth=1.5, color='#000000', ali
 message2 = visual.TextStim(win, pos=[0,-.5], wrapWidth=1.5, color='#000000', alignHoriz='center', name='bottomMsg', text="bbb",units='norm')
 
 # load VAS Qs & options
+startupProfiler.Start('parsers')
 [questions,options,answers] = BasicPromptTools.ParseQuestionFile(params['questionFile'])
 print('%d questions loaded from %s'%(len(questions),params['questionFile']))
 
 # get stimulus files
+startupProfiler.Start('stimuli')
 allImages = glob.glob(params['imageDir']+"*"+params['imageSuffix']) # get all files in <imageDir> that end in .<imageSuffix>.
 pracImages = glob.glob(params['pracDir']+"*"+params['imageSuffix']) # get all files in <imageDir> that end in .<imageSuffix>.
 promptImage = 'TIMprompt2.jpg'
@@ -236,27 +294,36 @@ print('%d images loaded from %s'%(len(allImages),params['imageDir']))
 if len(allImages)< 20:
     raise ValueError("# images found in '%s' (%d) is less than # trials (%d)!"%(params['imageDir'],len(allImages),params['nTrials']))
 
-# slice allImages into different colors 
-green = allImages[0:5]
-yellow = allImages [5:10]
-red = allImages [10:15]
-black = allImages [15:20]
-color_list = [1,2,3,4,1,2,3,4] #1-green, 2-yellow, 3-red, 4-black, ensure each color is presented twice at random per block
-
 #for "random" black heat or no heat
 randBlack = [0,0,0,0,0,0,1,1,1,1,1,1]
 random.shuffle(randBlack)
-randBlackCount = 0
 sleepRand = [0, 0.5, 1, 1.5, 2]
 
 #for "random" ITI 12-18 avg 15 sec
 painISI = [12,14,16,18,12,14,16,18]
-random.shuffle(painISI)
 
-# create stimImage
-stimImage = visual.ImageStim(win, pos=[0,0], name='ImageStimulus',image=black[0], units='pix')
+# medoc code for the heat level of each color (black is high heat or none, as set by randBlack)
+if params['useMedoc']:
+    heatCodes = {1: TempConv.GetTempCode(tempCodes, expInfo['LHeat']), 2: TempConv.GetTempCode(tempCodes, expInfo['MHeat']),
+        3: TempConv.GetTempCode(tempCodes, expInfo['HHeat']), 4: TempConv.GetTempCode(tempCodes, expInfo['HHeat'])}
+else:
+    heatCodes = None
+
+# decide every block's color order, ITIs, port and heat codes now (one row per stimulus), so trials only read their row
+timeline = Timeline.BuildTimeline(allImages, params['nBlocks'], params['nTrials'], params['stimDur'], params['painDur'],
+    params['ISI'], painISI, frameRate=frameRate, heatCodes=heatCodes, randBlack=randBlack)
+Timeline.Validate(timeline, allImages) # raises a ValueError before anything is shown
+for line in Timeline.Describe(timeline):
+    logging.log(level=logging.INFO, msg=line)
+
+# create an ImageStim for every image now, so showing one doesn't have to load it
+import StimCache
+stimCache = StimCache.StimCache(win, allImages + pracImages + [promptImage], pos=[0,0], name='ImageStimulus', units='pix')
+stimCache.Report(logging)
+stimImage = stimCache[allImages[0]]
 
 # read questions and answers from text files
+startupProfiler.Start('parsers')
 [topPrompts,bottomPrompts] = BasicPromptTools.ParsePromptFile(params['promptDir']+params['promptFile'])
 print('%d prompts loaded from %s'%(len(topPrompts),params['promptFile']))
 
@@ -272,110 +339,69 @@ print('%d questions loaded from %s'%(len(questions_vas3),params['moodQuestionFil
 [questions_prac,options_prac,answers_prac] = BasicPromptTools.ParseQuestionFile(params['introPractice'])
 print('%d questions loaded from %s'%(len(questions_prac),params['introPractice']))
 
-avgFile = open("anxScaleAvgs.csv", "w+")
+startupProfiler.Start('outputs')
+avgFile = AsyncWriter.AsyncWriter("anxScaleAvgs.csv", flushEvery=params['outputFlushEvery'], fsync=params['outputFsync'])
 avgFile.write('filename: %s\n'%filename)
 avgFile.write('subject: %s\n'%expInfo['subject'])
 avgFile.write('session: %s\n'%expInfo['session'])
 avgFile.write('date: %s\n\n'%dateStr)
-
-excelTemps = pd.read_excel(params['convExcel'])
-
+sessionStore = SessionStore.SessionStore(filename + '-session', meta={'expInfo': expInfo, 'params': params, 'date': dateStr,
+    'images': allImages}) # typed arrays for analysis
+sessionStore.SaveTimeline(timeline) # on disk before the first frame
 
 
+startupProfiler.Start('stimuli')
 anxSlider = visual.RatingScale(win=win, scale='How anxious do you feel right now?', name='anxSlider', 
     size=1.0, stretch=1.5, pos=(0, -0.7),textSize = 0.8, low=0,high=1, markerStart=0.5,tickHeight = 0.0,labels=("Not Anxious","Very Anxious"), 
     textFont='Helvetica Bold', textColor=params['textColor'], lineColor=params['textColor'], markerColor=params['textColor'], 
     showValue=False,showAccept=False,precision=1)
+anxBuffer = SliderData.SliderBuffer(maxSamples=1000000) # compact copy of anxSlider's history (16 bytes/sample)
+anxIntegrator = SliderData.TrialIntegrator(anxBuffer) # running average of the current trial's ratings
+
+anxSampler = SliderData.SliderSampler(anxSlider, rate=params['sliderSampleRate']) # uniform signal while anxSlider is shown
+
+# Copy new anxSlider ratings into the buffer, with globalClock times, and the trial average (call after each flip)
+def RecordSlider():
+    anxBuffer.Sync(anxSlider, globalClock)
+    anxIntegrator.Update()
+
+# Flip the window, moving and recording the slider; returns the flip time (every flip of a block should go through here)
+def Flip():
+    anxKeys.Update()
+    tFlip = win.flip() + flipClockOffset # stamped at the buffer swap, before the callOnFlip/logOnFlip work
+    flipRecorder.Record(tFlip)
+    RecordSlider()
+    if anxSlider.autoDraw:
+        anxSampler.Sample(tFlip)
+    return tFlip
 
 # ======================= #
 # == PERSISTENT SLIDER == #
 # ======================= #
 
-# import packages
-from pyglet.window import key
-
 # declare keys
 downKey = params['questionDownKey'] # makes slider go left (lower rating)
 upKey = params['questionUpKey'] # makes slider go right (higher rating)
 
-# Declare constants
-step = 0.01; # distance for short press
-holdDur = 0.050; # s before considered "held"
-releaseDur = 0.100; # s before considered "released"
-speed = 0.15; # distance per s
-
-# Initialize variables
-tPressed = 0;
-tLast = 0;
-keyLast = 0;
-startPoint = 0.5;
+# Move the slider while a key is held: key events set the press, Flip() moves the marker every frame
+anxKeys = RatingScales.HeldKeySlider(anxSlider, downKey, upKey, step=0.01, holdDur=0.050, speed=0.15) # speed = distance per s
+win.winHandle.push_handlers(anxKeys)
 currentSlider = None;
 
-# Set up pyglet key handler
-keyState=key.KeyStateHandler()
-win.winHandle.push_handlers(keyState)
-
-# Get attributes for key handler (put _ in front of numbers)
-if downKey[0].isdigit():
-    downKey_attr = '_%s'%downKey
-else:
-    downKey_attr = downKey.upper()
-if upKey[0].isdigit():
-    upKey_attr = '_%s'%upKey
-else:
-    upKey_attr = upKey.upper()
-
-# Declare function for key-press-and-hold
-def KeyHold():
-    # if currentSlider is inactive, do not continue
-    if (currentSlider is None) or (currentSlider.autoDraw == False):
-        return;
-    
-    # Look for keypresses
-    if keyState[getattr(key,downKey_attr)]: #returns True if left key is pressed
-        tPress = ts.time()
-        startPoint = currentSlider.markerPlacedAt
-        keyPressed = downKey_attr
-    elif keyState[getattr(key,upKey_attr)]: #returns True if the right key is pressed
-        tPress = ts.time()
-        startPoint = currentSlider.markerPlacedAt
-        keyPressed = upKey_attr
-    else:
-        keyPressed = None
-    
-    # print key & time
-    print('keyPressed = %s, tPress = %s'%(keyPressed,tPress))
-    
-    # Handle sliding for held keys
-    while (keyPressed is not None) and ((ts.time()-tStart)<questionDur):
-        # update time
-        pressDur = max(ts.time()-tPress-holdDur, 0)
-        # update display
-        #currentSlider.draw()
-        win.flip()
-        # check for key release
-        if keyState[getattr(key,keyPressed)]==False:
-            break
-        # Update marker
-        if (keyPressed==downKey_attr):
-            currentSlider.markerPlacedAt = startPoint - step - pressDur*speed
-        if (keyPressed==upKey_attr):
-            currentSlider.markerPlacedAt = startPoint + step + pressDur*speed
-        # enforce limits on rating
-        currentSlider.markerPlacedAt = max(currentSlider.markerPlacedAt,0.0)
-        currentSlider.markerPlacedAt = min(currentSlider.markerPlacedAt,1.0)
-
-
-# Create global event keys that call above function
-event.globalKeys.add(key=downKey, func=KeyHold)
-event.globalKeys.add(key=upKey, func=KeyHold)
-
-
 
 # ============================ #
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
+# switch stimImage to the preloaded stim for imageName (it takes over the old one's autoDraw)
+def SetStimImage(imageName):
+    global stimImage
+    newStim = stimCache[imageName]
+    if newStim is not stimImage:
+        newStim.autoDraw = stimImage.autoDraw
+        stimImage.autoDraw = False
+        stimImage = newStim
+
 # increment time of next window flip
 def AddToFlipTime(tIncrement=1.0):
     tNextFlip[0] += tIncrement
@@ -384,24 +410,36 @@ def AddToFlipTime(tIncrement=1.0):
 def SetFlipTimeToNow():
     tNextFlip[0] = globalClock.getTime()
     
+# exit gracefully if an escape key was pressed
+def CheckEscape():
+    keyList = event.getKeys()
+    # Check for escape characters
+    for key in keyList:
+        if key in ['q','escape']:
+            CoolDown()
+
+# sleep until tNextFlip[0] (spinning only for the last few ms), checking for escape keys along the way
 def WaitForFlipTime():
-    while (globalClock.getTime()<tNextFlip[0]):
-        keyList = event.getKeys()
-        # Check for escape characters
-        for key in keyList:
-            if key in ['q','escape']:
-                CoolDown()
-
-def ShowImage(imageName, block, stimDur=float('Inf')):
+    FrameTiming.WaitUntil(tNextFlip[0], globalClock.getTime, margin=params['waitMargin'],
+        checkInterval=params['escapeCheckInterval'], checkEscape=CheckEscape)
+
+# Flip (updating the slider) while another refresh fits before tDeadline, so the caller's next flip is the first
+# refresh at or after tDeadline rather than the one after that
+def FlipUntil(tDeadline):
+    while (globalClock.getTime() + 1.0/frameRate < tDeadline):
+        Flip()
+
+# show an image on the refresh nearest tOnset for nFrames refreshes; returns the time it appeared
+def ShowImage(imageName, portCode, tOnset, nFrames, heatName=None):
     # display info to experimenter
     print('Showing Stimulus %s'%imageName) 
     
     # Set image
-    stimImage.setImage(imageName)
-    # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
-        win.flip() # to update ratingScale
-    SetPort(imageName,block+1)
+    SetStimImage(imageName)
+    # Wait until it's time to display: half a frame early, so the flip lands on the refresh nearest tOnset
+    tNextFlip[0] = tOnset - 0.5/frameRate
+    FlipUntil(tNextFlip[0]) # to update ratingScale
+    SetPortData(portCode)
     # Start drawing stim image every frame
     stimImage.autoDraw = True; 
     anxSlider.setAutoDraw(False)
@@ -409,22 +447,18 @@ def ShowImage(imageName, block, stimDur=float('Inf')):
     
     # log & flip window to display image
     win.logOnFlip(level=logging.EXP, msg='Display %s'%imageName)
-    win.flip()
-#    if int(imageName[-5]) == 5:
-#        my_pathway.start()
-#        ts.sleep(3 + random.sample(sleepRand,1))
-#        my_pathway.trigger()
-#        ts.sleep(5)
-#        response = my_pathway.stop()
-    tStimStart = globalClock.getTime() # record time when window flipped
-    # set up next win flip time after this one
-    AddToFlipTime(stimDur) # add to tNextFlip[0]
+    if heatName is not None:
+        win.callOnFlip(heatScheduler.MarkOnset, heatName) # heat was armed for this stimulus
+    flipRecorder.StartTrial(imageName, tOnset)
+    tStimStart = Flip() # record time when window flipped; the slider is sampled on this frame too
+    # set up next win flip time after this one: nFrames after the planned onset, not after the actual one
+    AddToFlipTime(nFrames/frameRate) # add to tNextFlip[0]
     
     # Flush the key buffer and mouse movements
     event.clearEvents()
-    # Wait for relevant key press or 'stimDur' seconds
-    while (globalClock.getTime()<tNextFlip[0]): # until it's time for the next frame
-        win.flip() # to update rating scale
+    # Wait for relevant key press or nFrames frames; the flip that ends the image is the caller's
+    while (globalClock.getTime() + 1.0/frameRate < tNextFlip[0]): # while another frame fits before the end
+        Flip() # to update rating scale and add any new ratings to this trial's running average
         # get new keys
         newKeys = event.getKeys(keyList=['q','escape'],timeStamped=globalClock)
         # check each keypress for escape keys
@@ -435,6 +469,7 @@ def ShowImage(imageName, block, stimDur=float('Inf')):
     
     # Stop drawing stim image every frame
     stimImage.autoDraw = False;
+    flipRecorder.EndTrial() # logs frame count, late frames and onset error
     
     # Get stimulus time
     tStim = globalClock.getTime()-tStimStart
@@ -444,7 +479,7 @@ def ShowImage(imageName, block, stimDur=float('Inf')):
     if params['ISI']>0:# if there should be a fixation cross
         #fixation.draw() # draw it
         #win.logOnFlip(level=logging.EXP, msg='Display Fixation')
-        win.flip()
+        Flip()
         
     return tStimStart
 
@@ -456,35 +491,19 @@ def SetPortData(data):
         print(data)
     else:
         print('Port event: %d'%data)
+    sessionStore.AddPort(globalClock.getTime(), data)
 
 
 
-#use color, size, and block to calculate data for SetPortData
-def SetPort(image, block):
-    color = int(image[8])
-    size = int(image[-5])
-    SetPortData((color-1)*6**2 + (size - 1)*6 + (block - 1))
-#    if size == 1:
-#        if color == 1:
-#            code = excelTemps[excelTemps['Temp'].astype(str).str.contains(str(expInfo['LHeat']))]
-#            logging.log(level=logging.EXP,msg='set medoc %s'%(code.iat[0,1]))
-#        elif color == 2:
-#            code = excelTemps[excelTemps['Temp'].astype(str).str.contains(str(expInfo['MHeat']))]
-#            logging.log(level=logging.EXP,msg='set medoc %s'%(code.iat[0,1]))
-#        elif color == 3:
-#            code = excelTemps[excelTemps['Temp'].astype(str).str.contains(str(expInfo['HHeat']))]
-#            logging.log(level=logging.EXP,msg='set medoc %s'%(code.iat[0,1]))
-#        elif color == 4:
-#            if randBlack[randBlackCount] == 1:
-#                code = excelTemps[excelTemps['Temp'].astype(str).str.contains(str(expInfo['HHeat']))]
-#                logging.log(level=logging.EXP,msg='set medoc %s'%(code.iat[0,1]))
-#            else :
-#                code = 0
-#            randBlackCount += 1
-#        if code != 0:
-#            response = my_pathway.program(code.iat[0,1])
-#            my_pathway.start()
-#            my_pathway.trigger()
+# program and start the heat (code from the timeline, 0 for none) now, while the anticipation circles are shown, and trigger it when the full-size circle appears
+def ArmHeat(code, tFull, block, iStim):
+    logging.log(level=logging.EXP,msg='set medoc %s'%code)
+    if code == 0:
+        return None
+    # tFull is the planned onset of the full-size circle, 4 circles later
+    heatName = 'Block%d_Trial%d'%(block+1, iStim+5)
+    heatScheduler.Arm(code, tFull + params['heatDelay'], heatName, stopAfter=params['painDur'] - params['heatDelay'])
+    return heatName
 
 
 
@@ -646,6 +665,9 @@ def RunMoodVas(questions,options,name='MoodVas'):
 
 def CoolDown():
     
+    # cancel any heat that's still scheduled
+    if params['useMedoc']:
+        heatScheduler.Close(abort=True)
     # Stop drawing ratingScale (if it exists)
     try:
         currentSlider.setAutoDraw(False)
@@ -670,10 +692,9 @@ def CoolDown():
     # exit
     core.quit()
 
-#handle transition between blocks
-def BetweenBlock():
-    while (globalClock.getTime()<tNextFlip[0]):
-        win.flip() # to update ratingScale
+#handle transition between blocks (onPause is called while the message is up, before the next block's lead-in starts)
+def BetweenBlock(onPause=None):
+    FlipUntil(tNextFlip[0]) # to update ratingScale
     # stop autoDraw
     anxSlider.autoDraw = False
     AddToFlipTime(300)
@@ -683,66 +704,50 @@ def BetweenBlock():
     message1.draw()
     message2.draw()
     win.flip()
+    if onPause is not None:
+        onPause()
     thisKey = event.waitKeys(keyList=['space']) # use space bar to avoid accidental advancing
     if thisKey :
         tNextFlip[0] = globalClock.getTime() + 2.0
 
-#creates a new random color order to ensure each color is presented exactly twice at random within each block
-def colorOrder():
-    #randomize order
-    color_list = [1,2,3,4,1,2,3,4] #1-green, 2-yellow, 3-red, 4-black, ensure each color is presented twice at random
-    newImages = []
-    random.shuffle(color_list)
-    for i in color_list:
-        if i == 1 :
-            newImages = newImages + green
-        elif i == 2 :
-            newImages = newImages + yellow
-        elif i == 3 :
-            newImages = newImages + red
-        else :
-            newImages = newImages + black
-    # initialize main image stimulus
-    stimImage.setImage(newImages[0]) # initialize with first image
-    return newImages
-    
-def integrateData(ratingScale, arrayLength, iStim, avgArray, block):
-    thisHistory = ratingScale.getHistory()[arrayLength - 1:]
-    logging.log(level=logging.DATA,msg='RatingScale %s: history=%s'%(finalImages[iStim],thisHistory))
+# write the block's averages, slider signal, frame statistics and flip times (blockStart: first anxBuffer sample, first
+# anxSampler sample and first flipRecorder trial of the block)
+def SaveBlock(block, blockStart):
+    iBlockStart, iBlockSample, iBlockTrial = blockStart
+    avgFile.write('\n')
+    EveryHalf(anxBuffer, params['resampleStep'])
+    sessionStore.meta['sliderTimeOffset'] = anxBuffer.timeOffset # globalClock time of 0 on the avg file's grid
+    sliderFile = AsyncWriter.AsyncWriter('%s-slider-block%d.csv'%(filename,block+1), flushEvery=params['outputFlushEvery'], fsync=params['outputFsync'])
+    anxSampler.Export(sliderFile, iBlockSample)
+    sliderFile.close(wait=False) # finishes in the background
+    sessionStore.SaveBlock(block+1, slider=anxBuffer.View(iBlockStart), sliderUniform=anxSampler.buffer.View(iBlockSample),
+        frames=flipRecorder.Stats(iBlockTrial), flips=flipRecorder.Times())
+    sessionStore.Save(heat=heatScheduler.events if params['useMedoc'] else None)
+
+def integrateData(integrator, imageName, avgArray, block):
+    RecordSlider() # pick up ratings made since the last frame
+    logging.log(level=logging.DATA,msg='RatingScale %s: history=%s'%(imageName,integrator.TrialHistory()))
+    avgRate = integrator.EndTrial()
     if len(avgArray) == 0:
         avgFile.write('%s,' %(block + 1))
-        avgFile.write(finalImages[iStim][9:-6] + ',')
-    x = [a[1] for a in thisHistory]
-    y = [a[0] for a in thisHistory]
-    if len(thisHistory) == 1:
-        avgRate = y[0]
-    else :
-        avgRate = trapz(y,x)/(x[-1] - x[0])
+        avgFile.write(imageName[9:-6] + ',')
     avgArray.append(avgRate)
-    logging.log(level=logging.DATA,msg='RatingScale %s: avgRate=%s'%(finalImages[iStim],avgRate))
+    logging.log(level=logging.DATA,msg='RatingScale %s: avgRate=%s'%(imageName,avgRate))
     avgFile.write('%.3f,' % (avgRate))
     if len(avgArray) == 5 :
         avgFile.write(str(sum(avgArray) / float(len(avgArray))) + '\n')
         avgArray *= 0
-    arrayLength = len(ratingScale.getHistory())
-    return arrayLength
-
-def EveryHalf(ratingScale):
-    x = [a[1] for a in ratingScale.getHistory()]
-    y = [a[0] for a in ratingScale.getHistory()]
-    countTime = round(x[-1])
-    for b in np.arange(0, countTime, 0.5):
-        avgFile.write(str(b) + ',')
+    return avgRate
+
+# resample the session's slider history every step s, on the slider's own clock as getHistory() gives it, so the
+# rows are the same as the original loop wrote (anxBuffer.timeOffset, saved in meta.json, converts to globalClock)
+def EveryHalf(buffer, step=0.5):
+    samples = buffer.View() # whole session, like the original loop
+    times = samples[:,1] - buffer.timeOffset
+    y = samples[:,0].tolist() # python floats, so str() writes them as before
+    avgFile.write(''.join([str(b) + ',' for b in np.arange(0, round(times[-1]), step)]))
     avgFile.write('\n')
-    i = 0
-    for a in range(len(x)):
-        if x[a] == i:
-            avgFile.write(str(y[a]) + ',')
-            i = i + 0.5
-        elif x[a] > i:
-            missed = math.ceil((x[a] - i)/0.5)
-            avgFile.write((str(y[a-1]) + ',') * missed)
-            i = i + 0.5 * missed
+    avgFile.write(''.join([str(y[a]) + ',' for a in SliderData.ResampleIndex(times, step).tolist()]))
     avgFile.write('\n\n')
 
 def MakePersistentVAS(question, options, win, name='Question', textColor='black',pos=(0.,0.),stepSize=1., scaleTextPos=[0.,0.45], 
@@ -801,7 +806,7 @@ def RunPrompts():
         tNextFlip[0] = globalClock.getTime()
         for i in range(5) :
             WaitForFlipTime()
-            stimImage.setImage(pracImages[i])
+            SetStimImage(pracImages[i])
             # Start drawing stim image every frame
             stimImage.autoDraw = True; 
             win.flip()
@@ -810,7 +815,7 @@ def RunPrompts():
         
         WaitForFlipTime()   
         AddToFlipTime(180)
-        stimImage.setImage(promptImage)
+        SetStimImage(promptImage)
         stimImage.autoDraw = True; 
         win.flip()
         
@@ -832,6 +837,13 @@ def RunPrompts():
 # ===== MAIN EXPERIMENT ===== #
 # =========================== #
 
+# report startup times once the first frame is on screen
+def ReportStartup():
+    startupProfiler.MarkFirstFrame()
+    startupProfiler.Report(logging)
+startupProfiler.Start('to first frame')
+win.callOnFlip(ReportStartup)
+
 #RunMoodVas(questions_vas1,options_vas1,name='PreVAS')
 #
 #WaitForFlipTime()
@@ -842,9 +854,8 @@ def RunPrompts():
 # log experiment start and set up
 logging.log(level=logging.EXP, msg='---START EXPERIMENT---')
 tStimVec = np.zeros(params['nTrials'])
-
-# Randomize image order for first block
-finalImages = colorOrder()
+# pause before the first block (RunPrompts does this too, when it runs)
+tNextFlip[0] = max(tNextFlip[0], globalClock.getTime() + params['tStartup'])
 
 avgArray = []
 avgFile.write('Block,Color,Circ1,Circ2,Circ3,Circ4,Full,Avg\n')
@@ -866,51 +877,56 @@ for block in range(0, params['nBlocks']):
     # Show questions and options
     # Set up persistent slider
     anxSlider.setAutoDraw(True)
-    currentSlider = anxSlider; # Make KeyHold function apply to this slider
-    tStart = ts.time(); # start time is now
-    questionDur = np.inf; # slider has no max RT
+    currentSlider = anxSlider; # hidden by CoolDown
+    RecordSlider()
+    anxIntegrator.StartBlock(globalClock.getTime()) # the first trial doesn't integrate the pause before the block
+    iBlockStart = anxBuffer.nTotal # first anxSlider sample of this block
+    iBlockSample = anxSampler.buffer.nTotal # first uniform sample of this block
+    iBlockTrial = len(flipRecorder.trials) # first frame-statistics row of this block
+    flipRecorder.StartBlock() # keep this block's flip times from here (the last block's were saved in BetweenBlock)
 # Wait until it's time to display first stimulus
-    while (globalClock.getTime()<tNextFlip[0]):
-        win.flip() # to update ratingScale
+    # every onset of this block is a whole number of frames after tBlockAnchor: the block's deadline (or minLeadIn from
+    # now, if that has already passed), moved to the next refresh after a fresh flip
+    Flip()
+    tBlockAnchor = flipRecorder.NextRefresh(max(tNextFlip[0], globalClock.getTime() + params['minLeadIn']))
+    FlipUntil(tBlockAnchor - 0.5/frameRate) # to update ratingScale
     fixation.autoDraw = False # stop  drawing fixation cross
-    arrayLength = 1
-    painITI = 0
+    heatName = None
+    blockRows = timeline[timeline['block'] == block+1]
+    tPlanned = tBlockAnchor + blockRows['onsetFrame']/frameRate
               
-    for iStim in range(0,params['nTrials']):
-        if ((iStim + 1) % 5 == 0):
-            tStimStart = ShowImage(imageName=finalImages[iStim], block=block, stimDur=params['painDur'])
-            arrayLength = integrateData(anxSlider, arrayLength, iStim, avgArray, block)
-            if iStim < params['nTrials']:
-                itiPort = list(finalImages[iStim])
-                itiPort[-5] = "6"
-                "".join(itiPort)
-                SetPort(itiPort,block+1)
-                # pause
-                AddToFlipTime(painISI[painITI])
-                painITI += 1
-                fixation.autoDraw = True
-
-        else:
-            tStimStart = ShowImage(imageName=finalImages[iStim], block=block, stimDur=params['stimDur'])
-            arrayLength = integrateData(anxSlider, arrayLength, iStim, avgArray, block)
-            if iStim < params['nTrials']:
-                # pause
-                AddToFlipTime(params['ISI'])
+    for iStim, row in enumerate(blockRows):
+        imageName = allImages[row['iImage']]
+        if (iStim % 5 == 0) and params['useMedoc'] and iStim + 4 < len(blockRows):
+            heatName = ArmHeat(int(blockRows['heatCode'][iStim+4]), tPlanned[iStim+4], block, iStim) # heat code of the full-size circle
+        tStimStart = ShowImage(imageName=imageName, portCode=int(row['portCode']), tOnset=tPlanned[iStim], nFrames=int(row['nFrames']),
+            heatName=heatName if row['heatCode'] else None)
+        avgRate = integrateData(anxIntegrator, imageName, avgArray, block)
+        if row['itiPort'] >= 0: # full-size circle: mark the pause and show the fixation cross
+            SetPortData(int(row['itiPort']))
+            fixation.autoDraw = True
+        # pause (the next row's onset is set from tBlockAnchor; this only matters after the last one)
+        AddToFlipTime(float(row['iti']))
         # save stimulus time
         tStimVec[iStim] = tStimStart
+        sessionStore.AddTrial(block+1, iStim+1, imageName, int(row['portCode']), tStimStart, avgRate, tPlanned[iStim])
+    
+    # planned vs achieved onset of each stimulus, from the block anchor
+    FrameTiming.OnsetReport(block+1, [allImages[iImage] for iImage in blockRows['iImage']], tPlanned - tBlockAnchor,
+        tStimVec[:len(blockRows)] - tBlockAnchor, 1.0/frameRate, logging=logging)
     
     
     # Log anxiety responses manually
-    logging.log(level=logging.DATA,msg='RatingScale %s: history=%s'%(anxSlider.name,anxSlider.getHistory()))
+    RecordSlider()
+    logging.log(level=logging.DATA,msg='RatingScale %s: history=%s'%(anxSlider.name,anxBuffer.ToList(iBlockStart)))
     
-    # Randomize order of colors for next block
+    # pause for the experimenter before the next block, saving this one while the message is up
+    blockStart = (iBlockStart, iBlockSample, iBlockTrial)
     if block < (params['nBlocks']-1):
-        BetweenBlock()
-        finalImages = colorOrder()
-        random.shuffle(painISI)
+        BetweenBlock(onPause=lambda: SaveBlock(block, blockStart))
+    else:
+        SaveBlock(block, blockStart)
     logging.log(level=logging.EXP,msg='==== END BLOCK %d/%d ===='%(block+1,params['nBlocks']))
-    avgFile.write('\n')
-    EveryHalf(anxSlider)
 
 WaitForFlipTime()
 RunMoodVas(questions_vas3,options_vas3,name='PostRun')
@@ -8,6 +8,9 @@
 # Updated 7/29/20 by DJ - added VAS that's persistent throughout block, fixed color order, removed trial responses, simplified params
 # Updated 8/20/20 by JG - created functions for output
 # Updated 8/31/20 by JG - changed visuals, added heat input, added VAS pre, mid, post, modified instructions to start over
+# Updated 10/18/26 - GrowingSquare flips are recorded by FrameTiming.FlipRecorder (late frames, onset error)
+# Updated 10/18/26 - GrowingSquare plays a per-frame size trajectory locked to flip times, reports missed frames
+# Updated 10/18/26 - GrowingSquare flip times are the timestamps win.flip() returns, converted to globalClock
 
 
 from psychopy import core, gui, data, event, sound, logging 
@@ -21,6 +24,7 @@ import os, glob
 #import AppKit, os, glob # for monitor size detection, files - could not import on windows
 import BasicPromptTools # for loading/presenting prompts and questions
 import RatingScales
+import FrameTiming
 import random # for randomization of trials
 import string
 import math
@@ -46,6 +50,9 @@ params = {
     'painDur': 10,             # time of heat sensation (in seconds)
     'ISI': 0,                 # time between when one stimulus disappears and the next appears (in seconds)
     'tStartup': 5,            # pause time before starting first stimulus
+    'growSteps': 90,          # number of times the growing square gets bigger
+    'growStepDur': 0.133,     # time between size steps (in seconds)
+    'growStepSize': 0.044,    # size added at each step (in norm units)
 # declare prompt and question files
     'skipPrompts': False,     # go right to the scanner-wait page
     'promptDir': 'Text/',     # directory containing prompts and questions files
@@ -209,7 +216,12 @@ tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python vari
 
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
+flipClockOffset = globalClock.getTime() - logging.defaultClock.getTime() # win.flip() returns its time on logging.defaultClock; add this to get globalClock time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+frameRate = win.getActualFrameRate() or 60.0 # measured refresh rate (Hz); assume 60 if it can't be measured
+flipRecorder = FrameTiming.FlipRecorder(1.0/frameRate, logging=logging)
+# size of the growing square on each frame after it appears
+growSizes = FrameTiming.StepTrajectory(0.1, params['growStepSize'], params['growSteps'], params['growStepDur'], frameRate)
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -391,18 +403,26 @@ def GrowingSquare(color):
     else:
         col = 'gray'
     
-    rect = visual.Rect(win=win, units = 'norm', size = 0.1, fillColor = col, lineColor = col)
+    rect = visual.Rect(win=win, units = 'norm', size = growSizes[0], fillColor = col, lineColor = col)
+    animation = FrameTiming.FrameAnimation(growSizes, 1.0/frameRate, logging=logging)
     rect.draw()
     WaitForFlipTime()
     fixation.autoDraw = False
-    win.flip()
-
-    for i in range(90):
-        core.wait(0.133)
-        rect.size = rect.size + 0.044
+    flipRecorder.StartTrial('GrowingSquare%d'%color, tNextFlip[0])
+    tFlip = win.flip() + flipClockOffset
+    flipRecorder.Record(tFlip)
+    animation.Start(tFlip)
+
+    # draw the size due on the next flip, so dropped frames skip ahead instead of delaying the rest of the growth
+    iFrame = animation.Next(tFlip)
+    while iFrame is not None:
+        rect.size = growSizes[iFrame]
         rect.draw()
-        win.flip()
-        ++i
+        tFlip = win.flip() + flipClockOffset
+        flipRecorder.Record(tFlip)
+        iFrame = animation.Next(tFlip)
+    flipRecorder.EndTrial() # logs frame count, late frames and onset error
+    animation.Report('GrowingSquare%d'%color) # logs skipped frames and missed sizes
     if col is not 'gray':
         core.wait(params['painDur'])
 
@@ -0,0 +1,165 @@
+#!/usr/bin/env python2
+"""Pre-arm the Medoc thermode and trigger heat at scheduled times from a worker thread."""
+# HeatScheduler.py
+#
+# Created 10/18/26 - program/start the thermode ahead of the full-size circle, fire TRIGGER on schedule, log onset latency
+# Updated 10/18/26 - only a STATUS polled after START counts as ready; TRIGGER is skipped if the device never gets ready
+# Updated 10/18/26 - Close() gives up on the worker after a timeout; waits for READY stop as soon as it's cancelled
+# Updated 10/18/26 - Close(abort=True) sends ABORT from its own thread within the timeout and survives a dropped connection
+
+from psychopy import logging
+import threading
+import time
+from six.moves import queue
+
+
+class HeatScheduler(object):
+    """Queue heat deliveries on a worker thread so device calls never block the frame loop.
+
+    Each delivery is programmed and started as soon as it is armed, then TRIGGER is sent at the scheduled clock time.
+    The time from stimulus onset (see MarkOnset) to the TRIGGER being sent is logged for every delivery.
+
+    Args:
+        pathway (devices.Pathway): connected thermode; start its monitor to check readiness without polling
+        clock (psychopy.core.Clock): clock the trigger times are given in (e.g. globalClock)
+        spinTime (float): seconds before the trigger time to stop sleeping and spin; default 0.002
+        readyTimeout (float): seconds to wait for the device to be ready for TRIGGER after START; default 10
+    """
+
+    def __init__(self, pathway, clock, spinTime=0.002, readyTimeout=10.):
+        self.pathway = pathway
+        self.clock = clock
+        self.spinTime = spinTime
+        self.readyTimeout = readyTimeout
+        self.events = [] # (name, code, tArmed, tScheduled, tSent, tAcknowledged) for every delivery
+        self._onsets = {} # stimulus onset time by name
+        self._sent = {} # TRIGGER send time by name
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._Run, name='HeatScheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Arm(self, code, tTrigger, name, stopAfter=None):
+        """Program and start protocol code now and send TRIGGER at clock time tTrigger.
+
+        Args:
+            code (int): Medoc protocol code to program
+            tTrigger (float): clock time at which to send TRIGGER
+            name (str): stimulus name, used to match the onset passed to MarkOnset
+            stopAfter (float): seconds after the trigger to send STOP; default None (let the protocol end on its own)
+        """
+        logging.log(level=logging.EXP, msg='arm medoc %s for %s at %.3f' % (code, name, tTrigger))
+        self._jobs.put((code, tTrigger, name, stopAfter))
+
+    def MarkOnset(self, name):
+        """Record the onset of stimulus name (call right after its flip, e.g. with win.callOnFlip)."""
+        tOnset = self.clock.getTime()
+        with self._lock:
+            self._onsets[name] = tOnset
+            tSent = self._sent.pop(name, None)
+        if tSent is not None:
+            self._LogLatency(name, tOnset, tSent)
+
+    def Close(self, abort=False, timeout=1.):
+        """Stop the worker (cancelling queued deliveries and any wait in progress) and optionally ABORT the device.
+
+        Returns within timeout seconds in all, even if the worker is inside a device call (which ABORT then has to wait
+        for) or the connection has dropped, so quitting never hangs.
+        """
+        tGiveUp = time.time() + timeout
+        self._cancel.set()
+        self._jobs.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.log(level=logging.WARNING, msg='medoc scheduler still busy after %.1f s, not waiting for it' % timeout)
+        if abort:
+            aborter = threading.Thread(target=self._Abort, name='HeatSchedulerAbort')
+            aborter.daemon = True
+            aborter.start()
+            aborter.join(max(tGiveUp - time.time(), 0.))
+            if aborter.is_alive():
+                logging.log(level=logging.WARNING, msg='medoc ABORT not done after %.1f s, not waiting for it' % timeout)
+
+    def _Abort(self):
+        try:
+            self.pathway.abort()
+        except (IOError, OSError) as e: # e.g. the connection dropped
+            logging.log(level=logging.WARNING, msg='medoc ABORT failed: %s' % e)
+
+    def _Check(self, response, name):
+        if response and response['response'] != 'RESULT_OK':
+            logging.log(level=logging.WARNING, msg='medoc %s: %s returned %s' % (name, response['command_id'], response['response']))
+
+    def _LogLatency(self, name, tOnset, tSent):
+        logging.log(level=logging.EXP, msg='medoc %s: stimulus-to-heat latency %.4f s' % (name, tSent - tOnset))
+
+    def _WaitUntil(self, tTarget):
+        # sleep coarsely, then spin for the last few ms
+        while not self._cancel.is_set():
+            tLeft = tTarget - self.clock.getTime()
+            if tLeft <= 0:
+                return True
+            if tLeft > self.spinTime:
+                self._cancel.wait(min(tLeft - self.spinTime, 0.1)) # wakes at once on Close()
+        return False
+
+    def _WaitForReady(self, tStarted):
+        # a READY polled before START replied (e.g. left over from the last delivery) doesn't count;
+        # wait in short slices so Close() can cancel
+        tGiveUp = time.time() + self.readyTimeout
+        if self.pathway.monitor is not None and self.pathway.monitor.running:
+            future = self.pathway.monitor.wait_for('test_state', 'READY', after=tStarted)
+            while not self._cancel.is_set() and time.time() < tGiveUp:
+                if future.wait(0.05):
+                    return True
+            return not future.cancel() # drop the subscription (unless READY came in at the last moment)
+        while not self._cancel.is_set() and time.time() < tGiveUp:
+            response = self.pathway.call('STATUS', verbose=False)
+            if response and response['test_state'] == 'READY':
+                return True
+            self._cancel.wait(0.05)
+        return False
+
+    def _Run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None or self._cancel.is_set():
+                return
+            code, tTrigger, name, stopAfter = job
+            try:
+                tArmed = self.clock.getTime()
+                self._Check(self.pathway.program(code), name)
+                self._Check(self.pathway.start(), name)
+                if not self._WaitForReady(time.time()):
+                    if self._cancel.is_set():
+                        return
+                    logging.log(level=logging.ERROR, msg='medoc %s: device not ready for TRIGGER, heat skipped' % name)
+                    continue
+                if self.clock.getTime() > tTrigger:
+                    logging.log(level=logging.WARNING, msg='medoc %s: armed %.3f s late' % (name, self.clock.getTime() - tTrigger))
+                if not self._WaitUntil(tTrigger):
+                    return
+                tSent = self.clock.getTime()
+                response = self.pathway.trigger()
+                tAcknowledged = self.clock.getTime()
+                self._Check(response, name)
+            except (IOError, OSError) as e: # socket errors
+                logging.log(level=logging.ERROR, msg='medoc %s: %s' % (name, e))
+                continue
+            self.events.append((name, code, tArmed, tTrigger, tSent, tAcknowledged))
+            logging.log(level=logging.EXP, msg='trigger medoc %s for %s: scheduled %.4f, sent %.4f, acknowledged %.4f' % (code, name, tTrigger, tSent, tAcknowledged))
+            with self._lock:
+                tOnset = self._onsets.pop(name, None)
+                if tOnset is None:
+                    self._sent[name] = tSent
+            if tOnset is not None:
+                self._LogLatency(name, tOnset, tSent)
+            if stopAfter is not None:
+                if not self._WaitUntil(tTrigger + stopAfter):
+                    return
+                try:
+                    self.pathway.stop()
+                except (IOError, OSError) as e:
+                    logging.log(level=logging.ERROR, msg='medoc %s: %s' % (name, e))
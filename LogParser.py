@@ -0,0 +1,170 @@
+#!/usr/bin/env python2
+"""Parse GalbraithHeat PsychoPy log files into typed NumPy event arrays."""
+# LogParser.py
+#
+# Created 10/18/26 - streaming log parser with precompiled patterns, parallel over a folder of logs
+# Updated 10/18/26 - heat events keep their kind: 'set' when armed (code 0 = no heat), 'trigger' when delivered
+
+import ast
+import glob
+import multiprocessing
+import os
+import re
+import numpy as np
+from SessionStore import PORT_DTYPE, SLIDER_DTYPE
+
+
+# --- SCHEMA --- #
+ONSET_DTYPE = np.dtype([('t', 'f8'), ('image', 'S64'), ('color', 'i1'), ('size', 'i1'), ('block', 'i2')])
+BLOCK_DTYPE = np.dtype([('t', 'f8'), ('block', 'i2')])
+HEAT_DTYPE = np.dtype([('t', 'f8'), ('code', 'i4'), ('kind', 'S8')]) # kind: 'set' (armed) or 'trigger' (delivered)
+KEY_DTYPE = np.dtype([('t', 'f8'), ('key', 'S16')])
+AVG_DTYPE = np.dtype([('t', 'f8'), ('name', 'S64'), ('avgRate', 'f8'), ('block', 'i2')])
+HISTORY_DTYPE = np.dtype([('t', 'f8'), ('name', 'S64'), ('start', 'i8'), ('stop', 'i8'), ('block', 'i2')]) # rows start:stop of 'slider'
+
+# --- MESSAGE PATTERNS --- #
+# Each log line is 'time \tLEVEL \tmessage'. Messages are told apart by their first word, then matched with one of these.
+DISPLAY_RE = re.compile(r'Display (.*[\\/](\d)\w*?_(\d)\.\w+)$') # circle images, e.g. Display Circles\3Red_1.JPG
+PORT_RE = re.compile(r'set port \S+ to (\d+)$')
+MEDOC_RE = re.compile(r'(set|trigger) medoc (\d+)')
+BLOCK_RE = re.compile(r'==== START BLOCK (\d+)/\d+ ====$')
+KEY_RE = re.compile(r'Keypress: (.*)$')
+HISTORY_RE = re.compile(r'RatingScale (.*?): history=\[(.*)\]$')
+AVG_RE = re.compile(r'RatingScale (.*?): avgRate=(\S+)$')
+SAMPLE_RE = re.compile(r'\(([^,()]*), ([^,()]*)\)') # one (rating, time) tuple of a history list
+PARAM_RE = re.compile(r'(\w+): (.*)$')
+
+
+def _Float(text):
+    # history entries can be None or a category label
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+def _Value(text):
+    # parameter values are short reprs of numbers, strings, lists and tuples
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+# --- PARSE ONE LOG --- #
+# Returns a dict of typed arrays: 'onsets', 'blocks', 'ports', 'heat', 'keys', 'avgRates', 'histories' and 'slider'
+# (the samples of all histories, indexed by the start/stop fields of 'histories'), plus 'params' (a dict) and 'file'.
+# The file is read one line at a time and history lists are read with a regular expression, never eval'd.
+def ParseLog(fileName):
+    onsets, blocks, ports, heat, keys, avgRates, histories = [], [], [], [], [], [], []
+    slider = [] # (n, 2) float array of samples per history
+    nSamples = 0
+    params = {}
+    inParams = False
+    block = 0
+    with open(fileName) as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t', 2)
+            if len(fields) < 3: # continuation of a multi-line message
+                continue
+            try:
+                t = float(fields[0])
+            except ValueError:
+                continue
+            message = fields[2]
+            first = message[:4]
+
+            if first == 'Disp':
+                match = DISPLAY_RE.match(message)
+                if match:
+                    onsets.append((t, match.group(1), int(match.group(2)), int(match.group(3)), block))
+            elif first == 'set ':
+                match = PORT_RE.match(message)
+                if match:
+                    ports.append((t, int(match.group(1))))
+                else:
+                    match = MEDOC_RE.match(message)
+                    if match:
+                        heat.append((t, int(match.group(2)), match.group(1)))
+            elif first == 'trig':
+                match = MEDOC_RE.match(message)
+                if match:
+                    heat.append((t, int(match.group(2)), match.group(1)))
+            elif first == 'Rati':
+                match = HISTORY_RE.match(message)
+                if match:
+                    samples = SAMPLE_RE.findall(match.group(2))
+                    try:
+                        samples = np.array(samples, dtype=float) # all numbers (the usual case)
+                    except ValueError:
+                        samples = np.array([(_Float(rating), _Float(tSample)) for (rating, tSample) in samples])
+                    samples = samples.reshape(-1, 2)
+                    histories.append((t, match.group(1), nSamples, nSamples + len(samples), block))
+                    slider.append(samples)
+                    nSamples += len(samples)
+                else:
+                    match = AVG_RE.match(message)
+                    if match:
+                        avgRates.append((t, match.group(1), _Float(match.group(2)), block))
+            elif first == '====':
+                match = BLOCK_RE.match(message)
+                if match:
+                    block = int(match.group(1))
+                    blocks.append((t, block))
+            elif first == 'Keyp':
+                match = KEY_RE.match(message)
+                if match:
+                    keys.append((t, match.group(1)))
+            elif first == '---S' and message.startswith('---START PARAMETERS---'):
+                inParams = True
+            elif first == '---E' and message.startswith('---END PARAMETERS---'):
+                inParams = False
+            elif inParams:
+                match = PARAM_RE.match(message)
+                if match:
+                    params[match.group(1)] = _Value(match.group(2).strip())
+
+    return {'file': fileName,
+            'params': params,
+            'onsets': np.array(onsets, dtype=ONSET_DTYPE),
+            'blocks': np.array(blocks, dtype=BLOCK_DTYPE),
+            'ports': np.array(ports, dtype=PORT_DTYPE),
+            'heat': np.array(heat, dtype=HEAT_DTYPE),
+            'keys': np.array(keys, dtype=KEY_DTYPE),
+            'avgRates': np.array(avgRates, dtype=AVG_DTYPE),
+            'histories': np.array(histories, dtype=HISTORY_DTYPE),
+            'slider': np.concatenate(slider + [np.zeros((0, 2))]).view(SLIDER_DTYPE).reshape(-1)}
+
+# Return the (rating, time) samples of history row iHistory of a parsed log as an (n, 2) array
+def GetHistory(parsed, iHistory):
+    row = parsed['histories'][iHistory]
+    return parsed['slider'][row['start']:row['stop']].view(float).reshape(-1, 2)
+
+
+# --- PARSE A FOLDER OF LOGS --- #
+# Parse every log matching pattern in dirName on nProcesses worker processes (default: one per core).
+# Returns a list of ParseLog results sorted by file name. On Windows, call this under "if __name__ == '__main__':".
+def ParseDirectory(dirName, pattern='GalbraithHeat-*.log', nProcesses=None):
+    fileNames = sorted(glob.glob(os.path.join(dirName, pattern)))
+    return ParseFiles(fileNames, nProcesses)
+
+def ParseFiles(fileNames, nProcesses=None):
+    if len(fileNames) <= 1 or nProcesses == 1:
+        return [ParseLog(fileName) for fileName in fileNames]
+    pool = multiprocessing.Pool(nProcesses)
+    try:
+        return pool.map(ParseLog, fileNames, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    tStart = time.time()
+    results = ParseDirectory(sys.argv[1] if len(sys.argv) > 1 else '.')
+    for parsed in results:
+        print('%s: %d onsets, %d port events, %d histories (%d samples), %d keypresses, %d params' % (
+            parsed['file'], len(parsed['onsets']), len(parsed['ports']), len(parsed['histories']), len(parsed['slider']),
+            len(parsed['keys']), len(parsed['params'])))
+    print('parsed %d logs in %.3f s' % (len(results), time.time() - tStart))
@@ -11,6 +11,7 @@
 # Updated 1/10/19 by DJ - if no response, log VAS result manually
 # Updated 2/21/19 by DJ - fixed VAS bug where pos!=0 led to moving marker
 # Updated 2/25/19 by DJ - added tickHeight & tickLabelWidth, changed a couple variable names
+# Updated 10/18/26 - added HeldKeySlider for per-frame press-and-hold slider movement
 
 from psychopy import core, event, logging#, visual # visual and gui conflict, so don't import it here
 import time
@@ -122,3 +123,66 @@ def ShowVAS(questions_list, options_list, win, name='Question', questionDur=floa
 
 
     return rating,decisionTime,choiceHistory
+
+
+class HeldKeySlider(object):
+    """Move a RatingScale's marker while a key is held, one frame at a time.
+
+    Key presses and releases come in as pyglet window events (push this object with win.winHandle.push_handlers), and
+    Update() sets the marker from the time since the press, so calling it once per frame from the main loop replaces
+    a blocking press-and-hold loop: a tap moves the marker by step, and after holdDur it keeps moving at speed.
+
+    Args:
+        ratingScale (psychopy.visual.RatingScale): slider to move; presses are ignored while it isn't drawn (autoDraw)
+        downKey, upKey (str): keys that move the marker down/up (e.g. '1' and '2')
+        step (float): distance moved by a tap
+        holdDur (float): seconds before a press counts as held
+        speed (float): distance per second while held
+        markerMin, markerMax (float): limits of markerPlacedAt
+        getTime (function): clock for press times and Update; default time.time
+    """
+
+    def __init__(self, ratingScale, downKey, upKey, step=0.01, holdDur=0.050, speed=0.15, markerMin=0.0, markerMax=1.0,
+                 getTime=time.time):
+        self.ratingScale = ratingScale
+        self.step = step
+        self.holdDur = holdDur
+        self.speed = speed
+        self.markerMin = markerMin
+        self.markerMax = markerMax
+        self.getTime = getTime
+        self.keys = {_KeySymbol(downKey): -1, _KeySymbol(upKey): 1} # pyglet key symbol -> direction
+        self.direction = 0 # direction of the key being held (0 = none)
+        self.tPress = None
+        self.startPoint = None
+        self.released = False # released since the last Update (the press still moves the marker once)
+
+    def on_key_press(self, symbol, modifiers):
+        if symbol in self.keys and self.ratingScale.autoDraw:
+            self.direction = self.keys[symbol]
+            self.tPress = self.getTime()
+            self.startPoint = self.ratingScale.markerPlacedAt
+            self.released = False
+        # return None so psychopy still gets the key
+
+    def on_key_release(self, symbol, modifiers):
+        if self.direction != 0 and self.keys.get(symbol) == self.direction:
+            self.released = True
+
+    def Update(self):
+        """Move the marker for the key being held (call once per frame, before the flip)."""
+        if self.direction == 0:
+            return
+        pressDur = max(self.getTime() - self.tPress - self.holdDur, 0)
+        marker = self.startPoint + self.direction * (self.step + pressDur * self.speed)
+        self.ratingScale.markerPlacedAt = min(max(marker, self.markerMin), self.markerMax)
+        if self.released:
+            self.direction = 0
+            self.released = False
+
+def _KeySymbol(keyName):
+    # pyglet key symbol for a psychopy key name (put _ in front of numbers)
+    from pyglet.window import key
+    if keyName[0].isdigit():
+        return getattr(key, '_%s'%keyName)
+    return getattr(key, keyName.upper())
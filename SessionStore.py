@@ -0,0 +1,158 @@
+#!/usr/bin/env python2
+"""Save session data as typed NumPy arrays that load back without any text parsing."""
+# SessionStore.py
+#
+# Created 10/18/26 - per-session directory of .npy files (trials, slider, ports, heat) and meta.json
+# Updated 10/18/26 - frames.npy with per-trial frame timing (FrameTiming.FRAME_DTYPE)
+# Updated 10/18/26 - timeline.npy with the session's planned schedule (Timeline.TIMELINE_DTYPE), saved before the run
+# Updated 10/18/26 - planned onset of each trial (tPlanned) next to the achieved one
+# Updated 10/18/26 - slider and frame arrays saved once per block (SaveBlock) instead of rewritten whole every block
+# Updated 10/18/26 - flips-block<k>.npy: every flip time of each block
+# Updated 10/18/26 - every time in every table is on the session clock (globalClock); time base recorded in meta.json
+
+import json
+import os
+import re
+import numpy as np
+
+
+# --- SCHEMA --- #
+TRIAL_DTYPE = np.dtype([('block', 'i2'), ('trial', 'i2'), ('image', 'S64'), ('color', 'i1'), ('colorName', 'S8'),
+                        ('size', 'i1'), ('portCode', 'i2'), ('tOnset', 'f8'), ('avgRate', 'f8'), ('tPlanned', 'f8')])
+SLIDER_DTYPE = np.dtype([('rating', 'f8'), ('t', 'f8')]) # same layout as SliderData.SliderBuffer rows
+TIME_BASE = 'globalClock' # clock of every time saved (s since the session clock started), stored in meta.json
+PORT_DTYPE = np.dtype([('t', 'f8'), ('code', 'i2')])
+HEAT_DTYPE = np.dtype([('name', 'S32'), ('code', 'i4'), ('tArmed', 'f8'), ('tScheduled', 'f8'), ('tSent', 'f8'),
+                       ('tAcknowledged', 'f8')]) # same fields as HeatScheduler.events
+BLOCK_FILE_RE = re.compile(r'(\w+)-block(\d+)$') # per-block parts, e.g. slider-block3
+
+
+class SessionStore(object):
+    """Collect a session's trial table and events and save them, with the slider samples, as .npy files in one folder.
+
+    Each array is its own file (trials.npy, ports.npy, heat.npy, timeline.npy), so it can be loaded or memory-mapped on
+    its own; meta.json holds the parameters and subject info. The slider and frame arrays, which grow with the session,
+    are saved one block at a time by SaveBlock() (slider-block1.npy, ...), and Save() rewrites only the small tables, so
+    both can be called at the end of each block and the folder always holds a complete, loadable session so far.
+
+    All times are seconds on the session clock (globalClock in the task), so tables can be lined up directly:
+    trials tOnset/tPlanned, ports t, heat tArmed-tAcknowledged, frames, flips, slider t (RatingScale history converted from
+    the scale's own clock by SliderBuffer.Sync) and sliderUniform t (sampled at flip times). Only timeline.npy differs:
+    its onsets are planned times from the start of each block.
+
+    Args:
+        dirName (str): folder to save to (created if needed)
+        meta (dict): session info to save in meta.json (e.g. params and expInfo)
+    """
+
+    def __init__(self, dirName, meta=None):
+        self.dirName = dirName
+        if not os.path.isdir(dirName):
+            os.makedirs(dirName)
+        self.meta = dict(meta or {})
+        self.meta.setdefault('timeBase', TIME_BASE)
+        self.trials = [] # tuples in TRIAL_DTYPE order
+        self.ports = [] # (t, code)
+
+    def AddTrial(self, block, trial, image, portCode, tOnset, avgRate, tPlanned=np.nan):
+        """Add a row to the trial table. Color and size are read from the image name (e.g. 'Circles\\3Red_1.JPG')."""
+        self.trials.append((block, trial, image, int(image[8]), image[9:-6], int(image[-5]), portCode, tOnset, avgRate,
+                            tPlanned))
+
+    def AddPort(self, t, code):
+        """Record a port event."""
+        self.ports.append((t, code))
+
+    def SaveBlock(self, block, slider=None, sliderUniform=None, frames=None, flips=None):
+        """Write one block's slider samples and frame statistics (each block's files are written once).
+
+        Args:
+            block (int): block number (from 1)
+            slider (array): (n, 2) rating, time rows of the block's slider history (e.g. SliderBuffer.View(iBlockStart))
+            sliderUniform (array): (n, 2) rating, time rows of the block's fixed-rate slider signal
+            frames (array): the block's per-trial frame statistics (FrameTiming.FlipRecorder.Stats(iBlockTrial))
+            flips (array): the block's flip times (FrameTiming.FlipRecorder.Times())
+        """
+        self._SaveArray('slider-block%d'%block, _SliderRecords(slider))
+        self._SaveArray('sliderUniform-block%d'%block, _SliderRecords(sliderUniform))
+        if frames is not None:
+            self._SaveArray('frames-block%d'%block, frames)
+        if flips is not None:
+            self._SaveArray('flips-block%d'%block, np.asarray(flips, dtype=float))
+
+    def Save(self, heat=None):
+        """Write the trial, port and heat tables and meta.json.
+
+        Args:
+            heat (list): (name, code, tArmed, tScheduled, tSent, tAcknowledged) tuples (HeatScheduler.events)
+        """
+        self._SaveArray('trials', np.array(self.trials, dtype=TRIAL_DTYPE))
+        self._SaveArray('ports', np.array(self.ports, dtype=PORT_DTYPE))
+        self._SaveArray('heat', np.array(heat or [], dtype=HEAT_DTYPE))
+        with open(os.path.join(self.dirName, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=1, sort_keys=True, default=str)
+
+    def SaveTimeline(self, timeline):
+        """Write the planned schedule (Timeline.BuildTimeline()) and meta.json now, before the run starts."""
+        self._SaveArray('timeline', timeline)
+        with open(os.path.join(self.dirName, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=1, sort_keys=True, default=str)
+
+    def _SaveArray(self, name, array):
+        # write to a temporary file first, then swap it in, so a crash mid-save leaves the last complete file in place
+        fileName = os.path.join(self.dirName, name + '.npy')
+        tmpName = os.path.join(self.dirName, name + '.tmp.npy')
+        np.save(tmpName, array)
+        if hasattr(os, 'replace'): # python 3: atomic, even on Windows
+            os.replace(tmpName, fileName)
+        elif not os.path.exists(fileName):
+            os.rename(tmpName, fileName)
+        else:
+            # os.rename won't replace a file on Windows: move the old file aside first, and only delete it once the new
+            # one is in place (LoadSession falls back to name.old.npy if a crash left no name.npy)
+            oldName = os.path.join(self.dirName, name + '.old.npy')
+            if os.path.exists(oldName):
+                os.remove(oldName)
+            os.rename(fileName, oldName)
+            os.rename(tmpName, fileName)
+            os.remove(oldName)
+
+
+def _SliderRecords(samples):
+    if samples is None:
+        return np.zeros(0, dtype=SLIDER_DTYPE)
+    return np.ascontiguousarray(samples, dtype=float).view(SLIDER_DTYPE).reshape(-1)
+
+
+# --- LOAD A SAVED SESSION --- #
+# Returns a dict of arrays by name ('trials', 'slider', 'sliderUniform', 'ports', 'heat', 'frames', 'flips',
+# 'timeline') plus 'meta' (a dict). The per-block files of slider, sliderUniform, frames and flips are joined in block
+# order.
+# With mmap=True the arrays are read-only memory maps, so only the parts that are used get read from disk
+# (the joined per-block arrays are read into memory).
+def LoadSession(dirName, mmap=True):
+    session = {}
+    blocks = {} # name -> [(block, array)]
+    fileNames = sorted(os.listdir(dirName))
+    for fileName in fileNames:
+        name, ext = os.path.splitext(fileName)
+        if name.endswith('.old'): # left by a save that crashed before the new file was in place
+            name = name[:-4]
+            if name + '.npy' in fileNames:
+                continue
+        if ext == '.npy' and not name.endswith('.tmp'):
+            path = os.path.join(dirName, fileName)
+            try:
+                array = np.load(path, mmap_mode='r' if mmap else None)
+            except ValueError: # empty arrays can't be memory-mapped
+                array = np.load(path)
+            match = BLOCK_FILE_RE.match(name)
+            if match:
+                blocks.setdefault(match.group(1), []).append((int(match.group(2)), array))
+            else:
+                session[name] = array
+    for name, parts in blocks.items():
+        session[name] = np.concatenate([array for (block, array) in sorted(parts, key=lambda part: part[0])])
+    with open(os.path.join(dirName, 'meta.json')) as f:
+        session['meta'] = json.load(f)
+    return session
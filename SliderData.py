@@ -0,0 +1,277 @@
+#!/usr/bin/env python2
+"""Record, integrate and resample continuous slider ratings."""
+# SliderData.py
+#
+# Created 10/18/26 - running per-trial trapezoid average of RatingScale history
+# Updated 10/18/26 - vectorized zero-order-hold resampling onto a fixed time grid
+# Updated 10/18/26 - SliderBuffer: compact float64 record of slider samples with zero-copy views
+# Updated 10/18/26 - SliderSampler: fixed-rate slider signal exported per block
+# Updated 10/18/26 - TrialAverage for offline analysis
+# Updated 10/18/26 - Sync can convert RatingScale history times to another clock (e.g. globalClock)
+# Updated 10/18/26 - TrialIntegrator.StartBlock so a block's first trial doesn't integrate the pause before it
+
+import numpy as np
+
+
+class SliderBuffer(object):
+    """Compact record of (rating, time) slider samples in a growable float64 array.
+
+    Samples are numbered from 0 in the order they were added, for the whole session, and View returns a slice of the
+    array (no copy) by sample number, e.g. from the start of a trial or block. Views are only valid until the next
+    sample is added, since the array may be regrown or compacted.
+
+    Args:
+        capacity (int): samples to allocate room for at first; doubles when full
+        maxSamples (int): most samples to keep; when full, the oldest half is dropped. Default None (keep all)
+    """
+
+    def __init__(self, capacity=1024, maxSamples=None):
+        self.maxSamples = maxSamples
+        self.nTotal = 0 # samples added so far (the number of the next sample)
+        self.iOldest = 0 # number of the oldest sample still kept
+        self.nSynced = 0 # entries of the rating scale history copied so far (see Sync)
+        self.timeOffset = 0. # added to the rating scale's history times by Sync (0 without a clock)
+        self._data = np.empty((capacity, 2))
+
+    def __len__(self):
+        return self.nTotal - self.iOldest
+
+    def _MakeRoom(self, nNew):
+        nKept = len(self)
+        if nKept + nNew <= len(self._data):
+            return
+        if self.maxSamples is not None and nKept + nNew > self.maxSamples:
+            # drop the oldest samples, keeping the newest half (or as many as there's room for)
+            nDrop = max(nKept - self.maxSamples // 2, nKept + nNew - self.maxSamples)
+            nDrop = min(nDrop, nKept)
+            self._data[:nKept - nDrop] = self._data[nDrop:nKept]
+            self.iOldest += nDrop
+            nKept -= nDrop
+            if nKept + nNew <= len(self._data):
+                return
+        capacity = max(2 * len(self._data), nKept + nNew)
+        if self.maxSamples is not None:
+            capacity = min(capacity, max(self.maxSamples, nNew))
+        data = np.empty((capacity, 2))
+        data[:nKept] = self._data[:nKept]
+        self._data = data
+
+    def Append(self, rating, t):
+        """Add one sample."""
+        self._MakeRoom(1)
+        self._data[len(self)] = (rating, t)
+        self.nTotal += 1
+
+    def Extend(self, samples):
+        """Add a list of (rating, time) samples."""
+        if len(samples) == 0:
+            return
+        samples = np.asarray(samples, dtype=float)
+        if self.maxSamples is not None and len(samples) > self.maxSamples:
+            self.nTotal += len(samples) - self.maxSamples # too many to keep: skip the oldest
+            self.iOldest = self.nTotal
+            samples = samples[-self.maxSamples:]
+        self._MakeRoom(len(samples))
+        self._data[len(self):len(self) + len(samples)] = samples
+        self.nTotal += len(samples)
+
+    def Sync(self, ratingScale, clock=None):
+        """Add the entries appended to a RatingScale's history since the last call (call after each flip).
+
+        History times are on the RatingScale's own clock, which restarts whenever the scale is reset. Given a clock
+        (e.g. globalClock), they are converted to that clock's time by adding timeOffset, the difference between the
+        two clocks, read once on the first call and again after the scale is reset (its history gets shorter).
+        """
+        history = ratingScale.getHistory()
+        if len(history) < self.nSynced: # the scale was reset
+            self.nSynced = 0
+        if clock is not None and self.nSynced == 0:
+            self.timeOffset = clock.getTime() - ratingScale.clock.getTime()
+        if len(history) > self.nSynced:
+            samples = np.asarray(history[self.nSynced:], dtype=float)
+            samples[:, 1] += self.timeOffset
+            self.Extend(samples)
+            self.nSynced = len(history)
+
+    def View(self, iStart=0, iEnd=None):
+        """Return samples iStart to iEnd (default: to the newest) as an (n, 2) array of (rating, time) rows.
+
+        Samples that have been dropped to stay under maxSamples are left out.
+        """
+        if iEnd is None:
+            iEnd = self.nTotal
+        iStart = min(max(iStart, self.iOldest), iEnd)
+        return self._data[iStart - self.iOldest:iEnd - self.iOldest]
+
+    def ToList(self, iStart=0, iEnd=None):
+        """Return samples iStart to iEnd as a list of (rating, time) tuples, like RatingScale.getHistory() (for logging)."""
+        return [tuple(row) for row in self.View(iStart, iEnd).tolist()]
+
+
+class TrialIntegrator(object):
+    """Keep a running trapezoid area of slider samples so the trial average is ready at stimulus offset.
+
+    Only samples added to the buffer since the last Update are read, so the cost per frame does not grow with the
+    session. As in the old integrateData, each trial starts from the last sample of the previous trial, and a trial
+    with a single sample averages to that sample. StartBlock(t) drops the time of that carried-over sample, so the first
+    trial of a block holds the last rating from t (the block start) rather than integrating the pause between blocks.
+
+    Args:
+        buffer (SliderBuffer): samples to integrate
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.nRead = 0 # samples of the buffer read so far
+        self.iTrialStart = 0 # number of the first sample added during this trial
+        self.carried = None # (rating, time) the trial starts from: the last sample before it, or the held rating
+        self.area = 0. # trapezoid area of this trial's samples
+        self.tFirst = None
+        self.tLast = None
+        self.ratingLast = None
+
+    def Update(self):
+        """Add the samples added to the buffer since the last call (call once per frame)."""
+        samples = self.buffer.View(self.nRead)
+        self.nRead = self.buffer.nTotal
+        if len(samples) == 0:
+            return
+        ratings = samples[:, 0]
+        times = samples[:, 1]
+        if self.tLast is None:
+            self.tFirst = float(times[0])
+        else:
+            self.area += float(times[0] - self.tLast) * float(ratings[0] + self.ratingLast) / 2.0
+        self.area += float(np.dot(np.diff(times), ratings[1:] + ratings[:-1])) / 2.0
+        self.tLast = float(times[-1])
+        self.ratingLast = float(ratings[-1])
+
+    def TrialHistory(self):
+        """Return this trial's samples as a list of (rating, time) tuples (for logging), starting with the sample it was
+        carried over from, so TrialAverage() of the list gives the same average."""
+        history = self.buffer.ToList(self.iTrialStart, self.nRead)
+        if self.carried is not None:
+            history.insert(0, self.carried)
+        return history
+
+    def Average(self):
+        """Return the time-weighted average rating of this trial so far (None if there are no samples yet)."""
+        if self.tLast is None:
+            return None
+        if self.tLast == self.tFirst:
+            return self.ratingLast
+        return self.area / (self.tLast - self.tFirst)
+
+    def StartBlock(self, t=None):
+        """Start a new trial at time t from the last rating, which the slider still shows, dropping the time since it
+        was made. Without t (or before any sample), the trial starts from the next sample added to the buffer."""
+        self.Update()
+        self.iTrialStart = self.nRead
+        self.area = 0.
+        if t is None or self.tLast is None:
+            self.tLast = None
+            self.ratingLast = None
+            self.carried = None
+        else:
+            self.tLast = t
+            self.carried = (self.ratingLast, self.tLast)
+        self.tFirst = self.tLast
+
+    def EndTrial(self):
+        """Return the trial average and start the next trial from the last sample."""
+        self.Update()
+        avgRate = self.Average()
+        self.iTrialStart = self.nRead
+        if self.tLast is not None:
+            self.carried = (self.ratingLast, self.tLast)
+        self.area = 0.
+        self.tFirst = self.tLast
+        return avgRate
+
+
+class SliderSampler(object):
+    """Sample a slider's current rating at a fixed rate (or every frame), whether or not the marker moved.
+
+    RatingScale history only gets a point when the marker moves; this gives a uniform signal that lines up with
+    physiological recordings. Samples go into a SliderBuffer allocated up front.
+
+    Args:
+        ratingScale (psychopy.visual.RatingScale): slider to read with getRating()
+        rate (float): samples per second, on a grid starting at the first sample; default None (every call, i.e. every
+            frame when called after each flip)
+        capacity (int): samples to allocate room for; grows if exceeded
+    """
+
+    def __init__(self, ratingScale, rate=None, capacity=65536):
+        self.ratingScale = ratingScale
+        self.interval = 1.0 / rate if rate else 0.
+        self.buffer = SliderBuffer(capacity)
+        self.tNext = None # time of the next sample on the grid
+
+    def Sample(self, t):
+        """Record the current rating at time t if a sample is due. Returns True if one was recorded."""
+        if self.tNext is not None and t < self.tNext:
+            return False
+        rating = self.ratingScale.getRating()
+        self.buffer.Append(np.nan if rating is None else rating, t)
+        if self.interval > 0:
+            if self.tNext is None:
+                self.tNext = t
+            self.tNext += self.interval * (np.floor((t - self.tNext) / self.interval) + 1) # skip any missed samples
+        return True
+
+    def Export(self, fileName, iStart=0, iEnd=None):
+        """Write samples iStart to iEnd as csv with time and rating columns to fileName (a file name or open file)."""
+        samples = self.buffer.View(iStart, iEnd)
+        np.savetxt(fileName, samples[:, ::-1], fmt='%.6f', delimiter=',', header='time,rating', comments='')
+
+
+# Time-weighted average of one trial's (rating, time) samples, computed exactly as TrialIntegrator does during the task
+def TrialAverage(samples):
+    buffer = SliderBuffer(max(len(samples), 1))
+    buffer.Extend(samples)
+    return TrialIntegrator(buffer).EndTrial()
+
+
+# --- RESAMPLE RATINGS ONTO A FIXED GRID --- #
+# Zero-order hold: each grid point (0, step, 2*step, ...) takes the last rating made at or before it. This matches the
+# original EveryHalf loop exactly, including its edge cases:
+#   - grid points before the first sample take the *last* sample (the loop read y[-1])
+#   - when several samples fall exactly on a grid point, the loop kept the first one it reached while waiting for that
+#     point, or the second one if it jumped onto the point from an earlier sample
+#   - the grid stops before the last sample's time unless the loop was waiting for exactly that time
+def ResampleIndex(times, step=0.5):
+    """Return the index of the sample held at each grid point for sorted sample times (array of ints, -1 = last sample)."""
+    times = np.asarray(times, dtype=float)
+    nSamples = len(times)
+    grid = step * np.arange(int(np.ceil(times[-1] / step)) + 1)
+    grid = grid[grid <= times[-1]]
+    iFirst = np.searchsorted(times, grid, 'left') # first sample at or after each grid point
+    onGrid = iFirst < nSamples
+    onGrid[onGrid] = times[iFirst[onGrid]] == grid[onGrid]
+
+    # For grid points with a sample exactly on them, work out whether the loop was already waiting for that point
+    # when its first sample arrived (then that sample is used; otherwise the loop jumped to it and uses the next one).
+    # That depends on the previous sample: closer than one step -> waiting; further -> not; exactly one step back ->
+    # same as for the previous grid point, unless two samples sat there.
+    iPrev = iFirst - 1
+    tPrev = np.where(iPrev >= 0, times[np.maximum(iPrev, 0)], -np.inf)
+    gridPrev = np.concatenate(([-np.inf], grid[:-1]))
+    nAtPrev = np.diff(np.concatenate(([0], iFirst)))
+    waiting = np.where(iFirst == 0, grid == 0, (tPrev > gridPrev) | (nAtPrev >= 2))
+    inherit = onGrid & (iFirst > 0) & (tPrev == gridPrev) & (nAtPrev == 1)
+    iSource = np.maximum.accumulate(np.where(inherit, 0, np.arange(len(grid))))
+    waiting = waiting[iSource]
+
+    iSecond = np.minimum(iFirst + 1, nSamples - 1)
+    useSecond = onGrid & ~waiting & (iFirst + 1 < nSamples) & (times[iSecond] == grid)
+    index = np.where(onGrid, np.where(useSecond, iSecond, iFirst), iFirst - 1)
+    # the last grid point is only reached if a sample comes after it or the loop was waiting for it
+    if len(grid) and grid[-1] == times[-1] and not waiting[-1] and not useSecond[-1]:
+        index = index[:-1]
+    return index
+
+def Resample(times, ratings, step=0.5):
+    """Return (grid times, held ratings) as arrays for samples at sorted times."""
+    index = ResampleIndex(times, step)
+    return step * np.arange(len(index)), np.asarray(ratings, dtype=float)[index]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python2
+"""Time the setup phases of an experiment script from start to first frame."""
+# StartupProfiler.py
+#
+# Created 10/18/26 - per-phase startup timing and cold-start-to-first-frame time
+
+import time
+
+
+class StartupProfiler(object):
+    """Record how long each setup phase takes, and the total time until the first frame is on screen.
+
+    Phases run back to back: starting a phase ends the previous one. Times are kept in memory so they can be
+    logged once the log file exists.
+
+    Args:
+        tStart (float): time.time() when the script started; default now
+    """
+
+    def __init__(self, tStart=None):
+        self.tStart = time.time() if tStart is None else tStart
+        self.phases = [] # (name, duration in s) in the order they ran
+        self.tFirstFrame = None # s from tStart to the first frame
+        self._phase = None
+        self._tPhase = None
+
+    def Start(self, phase):
+        """End the current phase (if any) and start timing phase."""
+        self.Stop()
+        self._phase = phase
+        self._tPhase = time.time()
+
+    def Stop(self):
+        """End the current phase."""
+        if self._phase is not None:
+            self.phases.append((self._phase, time.time() - self._tPhase))
+            self._phase = None
+
+    def MarkFirstFrame(self):
+        """Record the first frame (call right after its flip, e.g. with win.callOnFlip). Later calls are ignored."""
+        if self.tFirstFrame is None:
+            self.Stop()
+            self.tFirstFrame = time.time() - self.tStart
+
+    def Report(self, logging=None):
+        """Print the phase times (summed over repeats of a phase) and log them at INFO level if a psychopy logging module is given."""
+        names = []
+        totals = {}
+        for (phase, duration) in self.phases:
+            if phase not in totals:
+                names.append(phase)
+                totals[phase] = 0.
+            totals[phase] += duration
+        lines = ['startup %s: %.3f s'%(phase, totals[phase]) for phase in names]
+        if self.tFirstFrame is not None:
+            lines.append('startup to first frame: %.3f s'%self.tFirstFrame)
+        for line in lines:
+            print(line)
+            if logging is not None:
+                logging.log(level=logging.INFO, msg=line)
+        return lines
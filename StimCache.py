@@ -0,0 +1,55 @@
+#!/usr/bin/env python2
+"""Preload image stimuli so showing one is a swap between ready-made ImageStims."""
+# StimCache.py
+#
+# Created 10/18/26 - one ImageStim per image file, decoded and uploaded once at startup
+
+import time
+
+
+class StimCache(object):
+    """Keep a ready ImageStim (image decoded and texture uploaded) for each image file.
+
+    Creating an ImageStim decodes its image and uploads the texture, so doing that for every file up front means a
+    trial only has to pick the stim to draw. Files that weren't preloaded are loaded the first time they're asked for.
+
+    Args:
+        win (psychopy.visual.Window): window to draw in
+        fileNames (list): image files to load now
+        **stimArgs: other ImageStim arguments (pos, units, name, ...), the same for every image
+    """
+
+    def __init__(self, win, fileNames=(), **stimArgs):
+        self.win = win
+        self.stimArgs = stimArgs
+        self.stims = {} # ImageStim by file name
+        self.loadTime = 0. # s spent loading
+        self.nBytes = 0 # texture memory, assuming 8-bit RGBA
+        self.Load(fileNames)
+
+    def Load(self, fileNames):
+        """Create the ImageStims for any of fileNames not loaded yet."""
+        from psychopy import visual # visual and gui conflict, so don't import it at the top
+        for fileName in fileNames:
+            if fileName in self.stims:
+                continue
+            tStart = time.time()
+            stim = visual.ImageStim(self.win, image=fileName, **self.stimArgs)
+            self.loadTime += time.time() - tStart
+            self.stims[fileName] = stim
+            if stim.units == 'pix' and stim.size is not None: # with units='pix' the default size is the image's
+                self.nBytes += int(stim.size[0]) * int(stim.size[1]) * 4
+
+    def __getitem__(self, fileName):
+        if fileName not in self.stims:
+            self.Load([fileName])
+        return self.stims[fileName]
+
+    def Report(self, logging=None):
+        """Print the number of images, load time and texture memory, and log them at INFO level if a psychopy logging module is given."""
+        line = 'stim cache: %d images loaded in %.3f s, about %.1f MB of textures' % (
+            len(self.stims), self.loadTime, self.nBytes / 1e6)
+        print(line)
+        if logging is not None:
+            logging.log(level=logging.INFO, msg=line)
+        return line
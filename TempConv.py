@@ -0,0 +1,50 @@
+#!/usr/bin/env python2
+"""Look up Medoc protocol codes for heat temperatures."""
+# TempConv.py
+#
+# Created 10/18/26 - build the temperature->code table from tempConv.xlsx once and cache it next to the spreadsheet
+
+import os
+
+
+# --- LOAD TEMPERATURE -> CODE TABLE --- #
+# The spreadsheet has a 'Temp' column and a code column. Reading it needs pandas and an Excel reader, so the table is
+# cached in a small text file (first line is the spreadsheet's mtime, then one 'temp,code' line per row) and only
+# rebuilt from the spreadsheet when its mtime changes.
+def LoadTempCodes(excelFile, cacheFile=None):
+    if cacheFile is None:
+        cacheFile = os.path.splitext(excelFile)[0] + '-codes.csv'
+    excelMtime = repr(os.path.getmtime(excelFile))
+
+    # use the cache if it was built from this version of the spreadsheet
+    if os.path.exists(cacheFile):
+        with open(cacheFile) as f:
+            if f.readline().strip() == excelMtime:
+                tempCodes = {}
+                for line in f:
+                    temp, code = line.split(',')
+                    tempCodes[int(temp)] = int(code)
+                return tempCodes
+
+    # rebuild from the spreadsheet
+    import pandas as pd
+    excelTemps = pd.read_excel(excelFile)
+    tempCodes = {}
+    for iRow in range(len(excelTemps)):
+        tempCodes[TempKey(excelTemps.iat[iRow,0])] = int(excelTemps.iat[iRow,1]) # codes can be stored as text
+    with open(cacheFile, 'w') as f:
+        f.write(excelMtime + '\n')
+        for temp in sorted(tempCodes.keys()):
+            f.write('%d,%d\n'%(temp,tempCodes[temp]))
+    return tempCodes
+
+# Temperatures are keyed in tenths of a degree so '41', 41.0 and '41.0' all match the same row exactly
+def TempKey(temp):
+    return int(round(float(temp)*10))
+
+# --- GET THE CODE FOR ONE TEMPERATURE --- #
+def GetTempCode(tempCodes, temp):
+    try:
+        return tempCodes[TempKey(temp)]
+    except KeyError:
+        raise ValueError('No Medoc code for temperature %s'%temp)
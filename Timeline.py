@@ -0,0 +1,124 @@
+#!/usr/bin/env python2
+"""Build, check and save the whole session's trial schedule before the run starts."""
+# Timeline.py
+#
+# Created 10/18/26 - one structured array row per stimulus: timing, image, port and heat codes for every block
+# Updated 10/18/26 - onsets and durations in refresh frames from the block start (onsetFrame, nFrames)
+
+import random
+import numpy as np
+
+
+TIMELINE_DTYPE = np.dtype([('block', 'i2'), ('trial', 'i2'), ('onset', 'f8'), ('duration', 'f8'), ('iImage', 'i2'),
+                           ('color', 'i1'), ('size', 'i1'), ('portCode', 'i2'), ('heatCode', 'i4'), ('iti', 'f8'),
+                           ('itiPort', 'i2'), ('onsetFrame', 'i4'), ('nFrames', 'i4')])
+COLORS = [1, 2, 3, 4] # 1-green, 2-yellow, 3-red, 4-black
+SIZES_PER_COLOR = 5 # 4 anticipation circles, then the full-size circle
+ITI_SIZE = 6 # size digit of the port code sent when the full-size circle ends
+
+
+# Parallel port code for a color, size and block (block and trial numbers start at 1)
+def PortCode(color, size, block):
+    return (color-1)*6**2 + (size - 1)*6 + (block - 1)
+
+# Color and size of an image, read from its name (e.g. 'Circles\\3Red_1.JPG' -> 3, 1)
+def ImageColorSize(image):
+    return int(image[8]), int(image[-5])
+
+
+# --- BUILD --- #
+# Returns a TIMELINE_DTYPE array with one row per stimulus of every block, in presentation order.
+# Each block shows each color twice, in random order, as its 5 circles from smallest to full size; only the first
+# nTrials circles of the block are shown. Anticipation circles last stimDur and are followed by isi; full-size circles
+# last painDur and are followed by a pause from painISI (reshuffled for each block) that starts with port code itiPort.
+# onset is the planned time from the block's first stimulus; onsetFrame and nFrames are the onset and duration in
+# refreshes at frameRate, each rounded from the block start (not summed) so rounding never accumulates.
+# heatCodes (color -> medoc code) sets heatCode on the full-size circles; black gets the code or 0 (no heat) from the
+# next entry of randBlack. Without heatCodes it's all 0.
+def BuildTimeline(images, nBlocks, nTrials, stimDur, painDur, isi, painISI, frameRate=60., heatCodes=None, randBlack=(),
+                  shuffle=random.shuffle):
+    byColor = dict((color, []) for color in COLORS)
+    for iImage, image in enumerate(images):
+        color, size = ImageColorSize(image)
+        byColor[color].append((size, iImage))
+    for color in COLORS:
+        byColor[color].sort()
+
+    rows = []
+    iBlack = 0
+    for block in range(1, nBlocks + 1):
+        colorOrder = COLORS + COLORS # each color twice per block
+        shuffle(colorOrder)
+        pauses = list(painISI)
+        shuffle(pauses)
+        sequence = [iImage for color in colorOrder for (size, iImage) in byColor[color]]
+        onset = 0.
+        iPause = 0
+        for iTrial in range(nTrials):
+            iImage = sequence[iTrial]
+            color, size = ImageColorSize(images[iImage])
+            heatCode = 0
+            if (iTrial + 1) % SIZES_PER_COLOR == 0: # full-size circle: heat, then a pause
+                duration = painDur
+                iti = pauses[iPause]
+                iPause += 1
+                itiPort = PortCode(color, ITI_SIZE, block)
+                if heatCodes is not None:
+                    heatCode = heatCodes[color]
+                    if color == 4: # black gets high heat or no heat at random
+                        if iBlack >= len(randBlack):
+                            raise ValueError('randBlack has fewer than the %d entries needed' % (iBlack + 1))
+                        if not randBlack[iBlack]:
+                            heatCode = 0
+                        iBlack += 1
+            else:
+                duration = stimDur
+                iti = isi
+                itiPort = -1
+            onsetFrame = int(round(onset * frameRate))
+            nFrames = int(round((onset + duration) * frameRate)) - onsetFrame
+            rows.append((block, iTrial + 1, onset, duration, iImage, color, size, PortCode(color, size, block),
+                         heatCode, iti, itiPort, onsetFrame, nFrames))
+            onset += duration + iti
+    return np.array(rows, dtype=TIMELINE_DTYPE)
+
+
+# --- CHECK --- #
+# Raise a ValueError describing the first problem found in a timeline built for images
+def Validate(timeline, images):
+    if len(timeline) == 0:
+        raise ValueError('timeline is empty')
+    if timeline['iImage'].min() < 0 or timeline['iImage'].max() >= len(images):
+        raise ValueError('timeline refers to images outside the %d loaded' % len(images))
+    for row in timeline:
+        color, size = ImageColorSize(images[row['iImage']])
+        if (color, size) != (row['color'], row['size']):
+            raise ValueError('block %d trial %d: color/size %d/%d do not match image %s' % (
+                row['block'], row['trial'], row['color'], row['size'], images[row['iImage']]))
+    if np.any(timeline['duration'] <= 0) or np.any(timeline['iti'] < 0):
+        raise ValueError('timeline has non-positive durations or negative pauses')
+    for block in np.unique(timeline['block']):
+        rows = timeline[timeline['block'] == block]
+        if np.any(rows['trial'] != np.arange(1, len(rows) + 1)):
+            raise ValueError('block %d: trials are not numbered 1-%d in order' % (block, len(rows)))
+        if not np.allclose(rows['onset'][1:], rows['onset'][:-1] + rows['duration'][:-1] + rows['iti'][:-1]):
+            raise ValueError('block %d: onsets do not follow from the durations and pauses' % block)
+        if np.any(rows['nFrames'] < 1) or np.any(rows['onsetFrame'][1:] < rows['onsetFrame'][:-1] + rows['nFrames'][:-1]):
+            raise ValueError('block %d: stimuli must last at least one frame and not overlap' % block)
+    codes = np.concatenate((timeline['portCode'], timeline['itiPort'][timeline['itiPort'] >= 0]))
+    if codes.min() < 0 or codes.max() > 255:
+        raise ValueError('port codes must fit in one byte (0-255)')
+    if np.any(timeline['heatCode'] < 0) or np.any(timeline['heatCode'][timeline['itiPort'] < 0] != 0):
+        raise ValueError('heat codes must be >= 0 and only on full-size circles')
+
+
+# One line per block for the log: number of stimuli, color and heat code of each full-size circle, planned length (s)
+def Describe(timeline):
+    lines = []
+    for block in np.unique(timeline['block']):
+        rows = timeline[timeline['block'] == block]
+        colors = rows['color'][rows['itiPort'] >= 0]
+        lines.append('timeline block %d: %d stimuli, colors %s, heat %s, %.1f s' % (
+            block, len(rows), colors.tolist(), rows['heatCode'][rows['itiPort'] >= 0].tolist(),
+            rows['onset'][-1] + rows['duration'][-1] + rows['iti'][-1]))
+    return lines
@@ -0,0 +1,79 @@
+"""Microbenchmark: struct/template command encoder vs the original bit-string encoder.
+
+Run from the repository root:  python benchmarks/bench_command_encoding.py
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from devices import Pathway
+
+
+def legacy_format_command(command, protocol, now=None):
+    """The original Pathway._format_command (with np.getbuffer replaced by tobytes so it runs on Python 3)."""
+    bin32 = lambda x : ''.join(reversed( [str((x >> i) & 1) for i in range(32)] ))
+
+    curtime = bin32(int(time.time() if now is None else now))
+    timelist = []
+    for i in range(1,5):
+        timelist.append(int(curtime[(i-1)*8:i*8],2))
+    timelist.reverse()
+
+    cmd = [command]
+
+    protocollist = []
+    if command==1 and protocol:
+        protocol = bin32(protocol)
+        for i in range(1,5):
+            protocollist.append(int(protocol[(i-1)*8:i*8],2))
+        protocollist.reverse()
+
+    MESSAGE =  timelist + cmd + protocollist # first should be time
+
+    sizelist = []
+    size = bin32(len(MESSAGE))
+    for i in range(1,5):
+        sizelist.append(int(size[(i-1)*8:i*8],2))
+    sizelist.reverse()
+
+    MESSAGE = np.array(sizelist + MESSAGE)
+    return MESSAGE.astype(np.uint8).tobytes()
+
+
+def make_pathway():
+    """A Pathway that never touches the network."""
+    pathway = Pathway.__new__(Pathway)
+    pathway._command_templates = {}
+    pathway.segmentation_points = {'TIMESTAMP_OFFSET': (4,8)}
+    return pathway
+
+
+def main(number=20000):
+    pathway = make_pathway()
+    cases = [(0, None), (1, 227), (2, None), (4, None)]
+
+    # outputs must match byte for byte (same second on both sides)
+    for command, protocol in cases:
+        now = int(time.time())
+        new = bytes(pathway._format_command(command, protocol))
+        if int(time.time()) == now:
+            assert new == legacy_format_command(command, protocol, now), (command, protocol)
+
+    print('%-28s %12s %12s' % ('command', 'legacy (us)', 'struct (us)'))
+    for command, protocol in cases:
+        t_legacy = timeit.timeit(lambda: legacy_format_command(command, protocol), number=number)
+        t_struct = timeit.timeit(lambda: pathway._format_command(command, protocol), number=number)
+        label = '%s(%s)' % (pathway_name(command), '' if protocol is None else protocol)
+        print('%-28s %12.2f %12.2f   x%.0f' % (label, 1e6*t_legacy/number, 1e6*t_struct/number, t_legacy/t_struct))
+
+
+def pathway_name(command):
+    return ['STATUS', 'TEST_PROGRAM', 'START', 'PAUSE', 'TRIGGER'][command]
+
+
+if __name__ == '__main__':
+    main()
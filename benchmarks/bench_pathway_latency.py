@@ -0,0 +1,67 @@
+"""Benchmark devices.Pathway latency, throughput and retry behaviour against the local PathwaySimulator.
+
+Run from the repository root:  python benchmarks/bench_pathway_latency.py [--latency 0.002 --jitter 0.001 -n 500]
+"""
+from __future__ import print_function
+import argparse
+import os
+import socket
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from devices import Pathway
+from devices_simulator import PathwaySimulator
+
+
+def time_calls(pathway, n, commands=(('STATUS', None),)):
+    """Issue n (command, protocol) calls, cycling through commands, and return per-call latencies in seconds and the failure count."""
+    latencies = np.zeros(n)
+    failures = 0
+    for i in range(n):
+        command, protocol = commands[i % len(commands)]
+        t0 = time.time()
+        try:
+            pathway.call(command, protocol)
+        except (socket.error, IOError):
+            failures += 1
+        latencies[i] = time.time() - t0
+    return latencies, failures
+
+
+def report(label, latencies, failures, extra=''):
+    ms = 1000. * latencies
+    print('%-34s mean %7.3f  p50 %7.3f  p95 %7.3f  p99 %7.3f ms  %8.0f calls/s  failures %d %s' % (
+        label, ms.mean(), np.percentile(ms, 50), np.percentile(ms, 95), np.percentile(ms, 99),
+        len(ms) / latencies.sum(), failures, extra))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=500, help='calls per scenario')
+    parser.add_argument('--latency', type=float, default=0., help='simulated device latency (s)')
+    parser.add_argument('--jitter', type=float, default=0., help='simulated device jitter (s)')
+    parser.add_argument('--drop-rate', type=float, default=.05, help='fault rate for the retry scenario')
+    args = parser.parse_args()
+
+    # a heat delivery: status, program, start, trigger
+    delivery = (('STATUS', None), ('TEST_PROGRAM', 227), ('START', None), ('TRIGGER', None))
+    for reuse_socket in (False, True):
+        with PathwaySimulator(latency=args.latency, jitter=args.jitter, seed=0) as sim:
+            pathway = Pathway(sim.ip, sim.port_number, verbose=False, reuse_socket=reuse_socket)
+            latencies, failures = time_calls(pathway, args.n, delivery)
+            report('%s connection' % ('persistent' if reuse_socket else 'per-call'), latencies, failures,
+                   '(%d connections)' % sim.connections)
+            pathway.close()
+
+    with PathwaySimulator(latency=args.latency, jitter=args.jitter, drop_rate=args.drop_rate, seed=0) as sim:
+        pathway = Pathway(sim.ip, sim.port_number, verbose=False, reuse_socket=True, max_reconnects=3)
+        latencies, failures = time_calls(pathway, args.n)
+        report('persistent, %.0f%% dropped' % (100 * args.drop_rate), latencies, failures,
+               '(%d reconnects, %d faults)' % (pathway.reconnects, sim.faults))
+        pathway.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark CPU use and deadline error of the task's waits: the old busy loops against FrameTiming.WaitUntil.
+
+Each scenario waits for n deadlines a random 20-200 ms ahead. CPU is the process CPU time over the wall time spent
+waiting (1.0 = one core busy). The flip scenarios stand in for a window at --refresh Hz (a flip sleeps until the next
+refresh) and report how many refreshes after its deadline the onset flip lands.
+
+Run from the repository root:  python benchmarks/bench_wait.py [-n 100 --refresh 60]
+"""
+from __future__ import print_function
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import FrameTiming
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def get_keys():
+    """Stand-in for event.getKeys(): a little work per call and no keys."""
+    return [k for k in ()]
+
+
+def busy_wait(t_deadline):
+    """The old WaitForFlipTime: poll the keyboard until the deadline."""
+    while clock() < t_deadline:
+        for key in get_keys():
+            pass
+
+
+def hybrid_wait(margin, check_interval=0.05):
+    def wait(t_deadline):
+        FrameTiming.WaitUntil(t_deadline, clock, margin=margin, checkInterval=check_interval, checkEscape=get_keys)
+    return wait
+
+
+def cpu_time():
+    t = os.times()
+    return t[0] + t[1]
+
+
+def run_waits(wait, n, seed=0):
+    """Return the CPU fraction and the lateness (s) of each of n waits."""
+    rng = random.Random(seed)
+    late = np.zeros(n)
+    cpu0, wall0 = cpu_time(), clock()
+    for i in range(n):
+        t_deadline = clock() + rng.uniform(0.02, 0.2)
+        wait(t_deadline)
+        late[i] = clock() - t_deadline
+    return (cpu_time() - cpu0) / (clock() - wall0), late
+
+
+class FakeWindow(object):
+    """A window whose flip() returns at the next refresh of a 1/frame_dur Hz display, like a vsync'd flip."""
+
+    def __init__(self, frame_dur):
+        self.frame_dur = frame_dur
+        self.t0 = clock()
+
+    def flip(self):
+        n = np.floor((clock() - self.t0) / self.frame_dur) + 1
+        FrameTiming.WaitUntil(self.t0 + n * self.frame_dur, clock, margin=0.001)
+        return clock()
+
+
+def old_flip_loop(win, t_deadline):
+    while clock() < t_deadline:
+        win.flip()
+
+
+def flip_until(win, t_deadline):
+    while clock() + win.frame_dur < t_deadline:
+        win.flip()
+
+
+def run_onsets(loop, win, n, seed=0):
+    """Return the frames from each of n deadlines to the onset flip that follows loop()."""
+    rng = random.Random(seed)
+    frames = np.zeros(n)
+    for i in range(n):
+        t_deadline = clock() + rng.uniform(0.02, 0.2)
+        loop(win, t_deadline)
+        frames[i] = (win.flip() - t_deadline) / win.frame_dur
+    return frames
+
+
+def report(label, cpu, late):
+    ms = 1000. * late
+    print('%-30s CPU %5.1f%%   late mean %6.3f  p95 %6.3f  max %6.3f ms' % (
+        label, 100 * cpu, ms.mean(), np.percentile(ms, 95), ms.max()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=100, help='deadlines per scenario')
+    parser.add_argument('--refresh', type=float, default=60., help='simulated refresh rate (Hz)')
+    args = parser.parse_args()
+
+    report('busy loop (old)', *run_waits(busy_wait, args.n))
+    for margin in (0.0005, 0.002, 0.005):
+        report('WaitUntil, margin %.1f ms' % (1000 * margin), *run_waits(hybrid_wait(margin), args.n))
+    report('sleep only (margin 0)', *run_waits(hybrid_wait(0.), args.n))
+
+    win = FakeWindow(1. / args.refresh)
+    for label, loop in (('flip loop (old)', old_flip_loop), ('FlipUntil', flip_until)):
+        frames = run_onsets(loop, win, args.n)
+        print('%-30s onset %.2f frames after the deadline on average (max %.2f)' % (label, frames.mean(), frames.max()))
+
+
+if __name__ == '__main__':
+    main()
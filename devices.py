@@ -5,16 +5,229 @@ Main Pathway Device Class
 =========================
 """
 
-__all__ = ['Pathway']
+__all__ = ['Pathway','PathwayCodec','PathwayResponse','PathwayMonitor','StateFuture']
 __author__ = ["Cosan Lab"]
 __license__ = "MIT"
 import socket
+import struct
+import threading
 import time
-import numpy as np
 from collections import OrderedDict
 import six
 
-class Pathway(object):
+TEST_STATES = {
+0: 'IDLE',
+1: 'RUNNING',
+2: 'PAUSED',
+3: 'READY'
+}
+STATE_CODES = {
+0: 'IDLE',
+1: 'READY',
+2: 'TEST'
+}
+COMMAND_CODES = {
+0: 'STATUS',
+1: 'TEST_PROGRAM',
+2: 'START',
+3: 'PAUSE',
+4: 'TRIGGER',
+5: 'STOP',
+6: 'ABORT',
+7: 'YES',
+8: 'NO'
+}
+# Commands that are safe to send twice: resent automatically if the connection drops before the reply arrives.
+# Anything else (e.g. TRIGGER, START, TEST_PROGRAM) may already have been executed, so it is never resent.
+IDEMPOTENT_COMMANDS = frozenset([0]) # STATUS
+
+RESPONSE_CODES = {
+0: 'RESULT_OK',
+1: 'RESULT_ILLEGAL_ARG',
+2: 'RESULT_ILLEGAL_STATE',
+3: 'RESULT_ILLEGAL_TEST_STATE',
+4096: 'RESULT_DEVICE_COMM_ERROR',
+8192: 'RESULT_SAFETY_WARNING',
+16384: 'RESULT_SAFETY_ERROR'
+}
+SEGMENTATION_POINTS = OrderedDict([
+('LENGTH_OFFSET', (0,4)),
+('TIMESTAMP_OFFSET', (4,8)),
+('COMMAND_OFFSET', 8),
+('SYSTEM_STATE_OFFSET',9),
+('TEST_STATE_OFFSET', 10),
+('RESULT_OFFSET', (11,13)),
+('TEST_TIME_OFFSET', (13,17)),
+('ERROR_MESSAGE_OFFSET', 17)
+])
+
+# Little-endian wire fields of a command message (see Pathway._format_command)
+COMMAND_HEADER = struct.Struct('<IIB') # length, timestamp, command
+PROTOCOL_FIELD = struct.Struct('<I')
+TIMESTAMP_FIELD = struct.Struct('<I')
+# Little-endian fixed header of a response message (see SEGMENTATION_POINTS)
+RESPONSE_HEADER = struct.Struct('<IIBBBHI') # length, timestamp, command, system state, test state, result, test time
+
+
+class PathwayResponse(object):
+
+    """
+    Decoded response from the Medoc system.
+
+    Fields are stored as the numbers sent by the device; names and formatted times are only built when read or printed.
+    Also supports dict-style access with the keys of the old response dict (e.g. response['test_state']).
+    Note: Test time is the time since machine was turned on.
+    """
+
+    __slots__ = ('response_length', 'timestamp', 'command_code', 'state_code', 'test_state_code', 'result_code', 'test_time', 'error_message')
+    KEYS = ('response_length', 'time_stamp', 'command_id', 'pathway_state', 'test_state', 'response', 'test_time_stamp')
+
+    def __init__(self, response_length, timestamp, command_code, state_code, test_state_code, result_code, test_time, error_message=None):
+        self.response_length = response_length
+        self.timestamp = timestamp # seconds since the epoch
+        self.command_code = command_code
+        self.state_code = state_code
+        self.test_state_code = test_state_code
+        self.result_code = result_code
+        self.test_time = test_time # milliseconds
+        self.error_message = error_message
+
+    @property
+    def time_stamp(self):
+        return time.ctime(self.timestamp)
+
+    @property
+    def command_id(self):
+        return COMMAND_CODES.get(self.command_code, self.command_code)
+
+    @property
+    def pathway_state(self):
+        return STATE_CODES.get(self.state_code, self.state_code)
+
+    @property
+    def test_state(self):
+        return TEST_STATES.get(self.test_state_code, self.test_state_code)
+
+    @property
+    def response(self):
+        return RESPONSE_CODES.get(self.result_code, self.result_code)
+
+    @property
+    def test_time_stamp(self):
+        hours, rest = divmod(self.test_time, 3600000)
+        mins, rest = divmod(rest, 60000)
+        secs, msecs = divmod(rest, 1000)
+        return '%.2d:%.2d:%.2d.%3d' %(hours,mins,secs,msecs)
+
+    def keys(self):
+        if self.error_message is None:
+            return list(self.KEYS)
+        return list(self.KEYS) + ['error_message']
+
+    def __getitem__(self, key):
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def get(self, key, default=None):
+        return self[key] if key in self.keys() else default
+
+    def to_dict(self):
+        """Return the response as the dict Pathway used to return."""
+        return dict((key, getattr(self, key)) for key in self.keys())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+class PathwayCodec(object):
+
+    """
+    Encodes commands for and decodes responses from the Medoc Pathway, without any connection.
+
+    Pathway and devices_async.AsyncPathway build on it and add their own transport.
+    """
+
+    def __init__(self):
+        self._command_templates = {} # formatted messages keyed by (command, protocol)
+        self.test_states = TEST_STATES
+        self.state_codes = STATE_CODES
+        self.command_codes = COMMAND_CODES
+        self.response_codes = RESPONSE_CODES
+        self.segmentation_points = SEGMENTATION_POINTS
+
+    def _command_id(self, command):
+        """Convert a command name to its command_id number (ids are passed through)."""
+        if isinstance(command,six.string_types):
+            for command_id, name in self.command_codes.items():
+                if name == command:
+                    return command_id
+            raise ValueError('Unknown command: %s' % command)
+        return command
+
+    def _format_command(self, command, protocol):
+        """
+        Format calls to device.
+
+        Messages are little-endian: 4-byte length (of everything after it), 4-byte timestamp, 1-byte command and, for TEST_PROGRAM, a 4-byte protocol number.
+        A template is built once per (command, protocol); each call patches the timestamp into its own copy, so threads sharing the Pathway (e.g. a PathwayMonitor) never see each other's buffers.
+
+        Args:
+            command (int): command_id number to send to device
+            protocol (int): protocol number on device to issue command to (only needed for command TEST_PROGRAM)
+
+        Returns:
+            message (bytes): formatted message to be sent
+
+        """
+        key = (command, protocol)
+        template = self._command_templates.get(key)
+        if template is None:
+            template = self._command_templates[key] = self._build_command_template(command, protocol)
+        MESSAGE = bytearray(template) # 12-16 bytes, never shared between calls
+        TIMESTAMP_FIELD.pack_into(MESSAGE, self.segmentation_points['TIMESTAMP_OFFSET'][0], int(time.time()) & 0xFFFFFFFF)
+        return bytes(MESSAGE)
+
+    def _build_command_template(self, command, protocol):
+        """
+        Helper function to pack a command message with an empty timestamp.
+        """
+        if command==1 and protocol:
+            body = COMMAND_HEADER.pack(COMMAND_HEADER.size + PROTOCOL_FIELD.size - 4, 0, command) + PROTOCOL_FIELD.pack(int(protocol) & 0xFFFFFFFF)
+        else:
+            body = COMMAND_HEADER.pack(COMMAND_HEADER.size - 4, 0, command)
+        return bytearray(body)
+
+    def _format_response(self, data, nbytes):
+        """
+        Format responses from device.
+        Note: Test time is the time since machine was turned on.
+
+        Args:
+            data: data bytes from devices
+            nbytes: length of bytes from devices
+
+        Returns:
+            response (PathwayResponse): decoded response, or None if data could not be decoded
+
+        """
+        try:
+            fields = RESPONSE_HEADER.unpack_from(data)
+        except struct.error:
+            print("ERROR FORMATTING RESPONSE")
+            print("data: ", repr(data))
+            print("nbyes: ", nbytes)
+            return None
+        response = PathwayResponse(*fields)
+        if response.response_length > RESPONSE_HEADER.size - 4:
+            start = self.segmentation_points['ERROR_MESSAGE_OFFSET']
+            response.error_message = bytes(data[start:4+response.response_length]).decode('utf-8','replace')
+        return response
+
+
+class Pathway(PathwayCodec):
 
     """
     Pathway is a class to communicate with the Medoc Pathway thermal stimulation machine.
@@ -25,11 +238,15 @@ class Pathway(object):
         timeout (float): seconds until connection timeouts; default 5s
         verbose (bool): flag whether to print responses; default True
         buffer_size (int): size of connection buffer; default 1024
+        reuse_socket (bool): keep one long-lived connection open and reuse it for every call; default False
+        max_reconnects (int): how many times a failed STATUS call on a reused connection reconnects and resends; other
+            commands reconnect and re-raise the error instead, since the device may have executed them; default 1
 
     """
 
-    def __init__(self, ip, port_number,timeout = 5.,verbose=True, buffer_size = 1024):
+    def __init__(self, ip, port_number,timeout = 5.,verbose=True, buffer_size = 1024, reuse_socket=False, max_reconnects=1):
 
+        super(Pathway, self).__init__()
         assert isinstance(ip,six.string_types), "IP address must be a string."
         assert isinstance(port_number,six.integer_types), "Port must be an integer"
 
@@ -38,48 +255,16 @@ class Pathway(object):
         self.BUFFER_SIZE = buffer_size
         self.timeout = timeout
         self.verbose = verbose
+        self.reuse_socket = reuse_socket
+        self.max_reconnects = max_reconnects
+        self.reconnects = 0 # number of times a reused connection had to be re-established
         self.socket = None
-        self.test_states = {
-        0: 'IDLE',
-        1: 'RUNNING',
-        2: 'PAUSED',
-        3: 'READY'
-        }
-        self.state_codes = {
-        0: 'IDLE',
-        1: 'READY',
-        2: 'TEST'
-        }
-        self.command_codes = {
-        0: 'STATUS',
-        1: 'TEST_PROGRAM',
-        2: 'START',
-        3: 'PAUSE',
-        4: 'TRIGGER',
-        5: 'STOP',
-        6: 'ABORT',
-        7: 'YES',
-        8: 'NO'
-        }
-        self.response_codes = {
-        0: 'RESULT_OK',
-        1: 'RESULT_ILLEGAL_ARG',
-        2: 'RESULT_ILLEGAL_STATE',
-        3: 'RESULT_ILLEGAL_TEST_STATE',
-        4096: 'RESULT_DEVICE_COMM_ERROR',
-        8192: 'RESULT_SAFETY_WARNING',
-        16384: 'RESULT_SAFETY_ERROR'
-        }
-        self.segmentation_points = OrderedDict({
-        'LENGTH_OFFSET': (0,4),
-        'TIMESTAMP_OFFSET': (4,8),
-        'COMMAND_OFFSET': 8,
-        'SYSTEM_STATE_OFFSET':9,
-        'TEST_STATE_OFFSET': 10,
-        'RESULT_OFFSET': (11,13),
-        'TEST_TIME_OFFSET': (13,17),
-        'ERROR_MESSAGE_OFFSET': 17
-        })
+        self.monitor = None # PathwayMonitor started by start_monitor
+        self._call_lock = threading.RLock() # the long-lived socket may be shared with a monitor thread
+        self._check_connection()
+
+    def _check_connection(self):
+        """Issue a STATUS call to make sure the device is reachable."""
         try:
             _ = self.call('STATUS',verbose=False)
             print('Connection to Pathway successful')
@@ -88,157 +273,119 @@ class Pathway(object):
 
     def _create_connection(self):
         """Create and return new socket connection"""
-        socket.setdefaulttimeout(self.timeout)
         s = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # commands are tiny, don't let Nagle hold them back
         s.connect((self.ip,self.port_number))
         return s
 
-    def call(self, command, protocol=None, reuse_socket=False, verbose = False):
+    def _get_connection(self):
+        """Return the long-lived socket connection, creating it if needed"""
+        if self.socket is None:
+            self.socket = self._create_connection()
+        return self.socket
+
+    def close(self):
+        """Close the long-lived socket connection, if there is one."""
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except socket.error:
+                pass
+            self.socket = None
+
+    def _recv_exactly(self, s, n, deadline):
+        """
+        Read exactly n bytes from socket s, handling short reads.
+
+        Args:
+            s (socket): connected socket
+            n (int): number of bytes to read
+            deadline (float): time.time() by which all bytes must have arrived
+
+        Returns:
+            data (bytes): the n bytes read
+        """
+        chunks = []
+        remaining = n
+        while remaining > 0:
+            time_left = deadline - time.time()
+            if time_left <= 0:
+                raise socket.timeout('Timed out waiting for %d more bytes from device' % remaining)
+            s.settimeout(time_left)
+            chunk = s.recv(min(remaining, self.BUFFER_SIZE))
+            if not chunk:
+                raise socket.error('Connection closed by device')
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def _send_and_receive(self, s, MESSAGE):
+        """Send a formatted message on socket s and return (data, nbytes) once the whole response has arrived."""
+        deadline = time.time() + self.timeout
+        s.settimeout(self.timeout)
+        s.sendall(MESSAGE)
+        nbytes = len(MESSAGE)
+        # The response starts with its length (not counting the length field itself)
+        start, stop = self.segmentation_points['LENGTH_OFFSET']
+        header = self._recv_exactly(s, stop - start, deadline)
+        length = struct.unpack('<I', header)[0]
+        data = header + self._recv_exactly(s, length, deadline)
+        return data, nbytes
+
+    def call(self, command, protocol=None, reuse_socket=None, verbose = None):
         """
         Send command to device.
 
         Args:
             command (str/int): command name or command_id number to send to device
             protocol (str/int): protocol number on device to issue command to (only needed for command TEST_PROGRAM)
-            reuse_socket (bool): try to reuse the last created socket connection; *NOT CURRENTLY FUNCTIONAL*
-            verbose (bool): whether to print out the device callback
+            reuse_socket (bool): send over the long-lived connection instead of opening a new one; default None (use the value given at construction)
+            verbose (bool): whether to print out the device callback; default None (use the value given at construction)
 
         Returns:
-            response (dict): response from Medoc system
+            response (PathwayResponse): response from Medoc system
         """
 
-        if reuse_socket:
-            raise NotImplementedError("Reusing sockets does not currently work.")
-            if self.socket:
-                s = self.socket
-            else:
-                raise ValueError("No previous sockets exist")
-        else:
-            s = self._create_connection()
-            self.socket = s
+        if reuse_socket is None:
+            reuse_socket = self.reuse_socket
 
-        if isinstance(command,str):
-            command = self.command_codes.keys()[self.command_codes.values().index(command)]
+        command = self._command_id(command)
 
         if command ==1 and protocol is None:
             raise ValueError('TEST_PROGRAM command requires a protocol number')
 
         MESSAGE = self._format_command(command, protocol)
-        nbytes = s.send(MESSAGE)
-        time.sleep(0.5)
-        data = s.recv(self.BUFFER_SIZE)
+        if reuse_socket:
+            # A dropped connection only shows up when we use it, so reconnect (and resend, if that's safe)
+            attempt = 0
+            with self._call_lock:
+                while True:
+                    try:
+                        data, nbytes = self._send_and_receive(self._get_connection(), MESSAGE)
+                        break
+                    except socket.error:
+                        self.close()
+                        if command not in IDEMPOTENT_COMMANDS or attempt >= self.max_reconnects:
+                            raise
+                        attempt += 1
+                        self.reconnects += 1
+        else:
+            s = self._create_connection()
+            try:
+                data, nbytes = self._send_and_receive(s, MESSAGE)
+            finally:
+                s.close()
         response = self._format_response(data,nbytes)
-        if not response:
-            return self.call(command,protocol,verbose=verbose)
+        if not response and command in IDEMPOTENT_COMMANDS:
+            return self.call(command,protocol,reuse_socket=reuse_socket,verbose=verbose)
+        if verbose is None:
+            verbose = self.verbose
         if verbose:
-            print_flag = verbose
-        else:
-            print_flag = self.verbose
-        if print_flag:
             print(response)
         return response
 
-    def _format_command(self, command, protocol):
-        """
-        Format calls to device.
-
-        Args:
-            command (str/int): command name or command_id number to send to device
-            protocol (int): protocol number on device to issue command to (only needed for command TEST_PROGRAM)
-
-        Returns:
-            message: formatted message to be sent
-
-        """
-        bin32 = lambda x : ''.join(reversed( [str((x >> i) & 1) for i in range(32)] ))
-
-        curtime = bin32(int(time.time()))
-        timelist = []
-        for i in range(1,5):
-            timelist.append(int(curtime[(i-1)*8:i*8],2))
-        timelist.reverse()
-
-        cmd = [command]
-
-        protocollist = []
-        if command==1 and protocol:
-            protocol = bin32(protocol)
-            for i in range(1,5):
-                protocollist.append(int(protocol[(i-1)*8:i*8],2))
-            protocollist.reverse()
-
-        MESSAGE =  timelist + cmd + protocollist # first should be time
-
-        sizelist = []
-        size = bin32(len(MESSAGE))
-        for i in range(1,5):
-            sizelist.append(int(size[(i-1)*8:i*8],2))
-        sizelist.reverse()
-
-        MESSAGE = np.array(sizelist + MESSAGE)
-        MESSAGE = np.getbuffer(MESSAGE.astype(np.uint8),size=len(MESSAGE))
-        return MESSAGE
-
-    def _format_response(self, data, nbytes):
-        """
-        Format responses from device.
-        Note: Test time is the time since machine was turned on.
-
-        Args:
-            data: data bytes from devices
-            nbytes: length of bytes from devices
-
-        Returns:
-            response (dict): dictionary of response data
-
-        """
-        data_int = [int(elem.encode('hex'),16) for elem in data]
-
-        response_dict = {}
-        try:
-            response_dict['response_length'] = self._decode(data_int,'LENGTH_OFFSET')
-            response_dict['time_stamp'] = time.ctime(self._decode(data_int,'TIMESTAMP_OFFSET'))
-            response_dict['command_id'] = self.command_codes[data_int[self.segmentation_points['COMMAND_OFFSET']]]
-            response_dict['pathway_state'] = self.state_codes[data_int[self.segmentation_points['SYSTEM_STATE_OFFSET']]]
-            response_dict['test_state'] = self.test_states[data_int[self.segmentation_points['TEST_STATE_OFFSET']]]
-            response_dict['response'] =  self.response_codes[self._decode(data_int,'RESULT_OFFSET')]
-            response_dict['test_time_stamp'] = self._decode_test_time(data_int)
-
-            if response_dict['response_length'] > 13:
-                #Covert to uint8 and native?
-                response_dict['error_message'] = data[self.segmentation_points['ERROR_MESSAGE_OFFSET']]
-        except Exception as e:
-            print("ERROR FORMATTING RESPONSE")
-            print("data_int: ", data_int)
-            print("data: ", data)
-            print("nbyes: ", nbytes)
-        return response_dict
-
-    def _decode(self,data_int,whichtime):
-        """
-        Helper function to decode response.
-        """
-        bin8 = lambda x : ''.join(reversed( [str((x >> i) & 1) for i in range(8)] ))
-        dat_int = data_int[self.segmentation_points[whichtime][0]:self.segmentation_points[whichtime][1]]
-        dat_bin = [bin8(dat_int[i])for i in range(0,self.segmentation_points[whichtime][1]-self.segmentation_points[whichtime][0])]
-        dat_bin.reverse()
-        dat_bin = "".join(dat_bin)
-        return int(dat_bin,2)
-
-    def _decode_test_time(self,data_int):
-        """
-        Helper function to decode response time.
-        """
-        test_time = self._decode(data_int,'TEST_TIME_OFFSET')
-
-        hours = test_time//3600000
-        mins = (test_time-(hours*3600000))//60000
-        secs = (test_time-(hours*3600000)-(mins*60000))//1000
-        msecs = test_time-(hours*3600000)-(mins*60000)-(secs*1000)
-        test_time = '%.2d:%.2d:%.2d.%3d' %(hours,mins,secs,msecs)
-        return test_time
-
-    def poll_for_change(self,to_watch,desired_value,poll_interval=.5,poll_max=-1,verbose=False,server_lag=1.,reuse_socket=False):
+    def poll_for_change(self,to_watch,desired_value,poll_interval=.5,poll_max=-1,verbose=False,server_lag=1.,reuse_socket=None):
         """
         Poll system for a value change. Useful for waiting until the Medoc system has transitioned to a specific state in order to issue another command, but the transition length is unknowable.
 
@@ -249,18 +396,29 @@ class Pathway(object):
             poll_max (int): upper limit on polling attempts; default -1 (unlimited)
             verbose (bool): print poll attempt number and current state
             server_lag (float): sometimes if the socket connection is pinged too quickly after a value change the subsequent command after this method is called can get missed. This adds an additional layer of timing delay before returning from this method to prevent this; default 1s
-            reuse_socket (bool): try to reuse the last created socket connection; *NOT CURRENTLY FUNCTIONAL*
+            reuse_socket (bool): poll over the long-lived connection instead of opening a new one each time; default None (use the value given at construction)
 
         Returns:
             status (bool): whether desired_value was achieved
 
         """
+        if self.monitor is not None and self.monitor.running:
+            # the monitor is already polling, so just wait for it to see the change
+            timeout = poll_interval*poll_max if poll_max > 0 else None
+            future = self.monitor.wait_for(to_watch,desired_value)
+            if not future.wait(timeout):
+                future.cancel() # don't leave the subscription behind
+                print("Polling limit exceeded")
+                return False
+            time.sleep(server_lag)
+            return True
+
         val = ''
         count = 1
         while val != desired_value:
             if verbose:
                 print("Poll: {}".format(str(count)))
-            resp = self.call('STATUS',reuse_socket=False)
+            resp = self.call('STATUS',reuse_socket=reuse_socket)
             if resp:
                 val = resp[to_watch]
             else:
@@ -275,6 +433,27 @@ class Pathway(object):
         time.sleep(server_lag)
         return True
 
+    def start_monitor(self, poll_interval=.1):
+        """
+        Start a background PathwayMonitor that keeps the latest device state in memory. While it runs, poll_for_change waits on it instead of polling.
+
+        Args:
+            poll_interval (float): seconds between STATUS polls; default .1s
+
+        Returns:
+            monitor (PathwayMonitor): the running monitor
+        """
+        if self.monitor is None or not self.monitor.running:
+            self.monitor = PathwayMonitor(self, poll_interval=poll_interval)
+            self.monitor.start()
+        return self.monitor
+
+    def stop_monitor(self):
+        """Stop the background PathwayMonitor, if there is one."""
+        if self.monitor is not None:
+            self.monitor.stop()
+            self.monitor = None
+
     #Convenience wrappers around call method
 
     def status(self):
@@ -312,3 +491,218 @@ class Pathway(object):
     def no(self):
         """ Convenience method."""
         return self.call('NO')
+
+
+class StateFuture(object):
+
+    """
+    Result of PathwayMonitor.wait_for: completes with the first STATUS response in which the watched field has the desired value.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._response = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._cancel_fn = None # removes the monitor subscription that would complete this future
+        self._cancelled = False
+
+    def done(self):
+        """Whether the desired state has been seen."""
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Block until done or timeout seconds have passed; returns done()."""
+        self._event.wait(timeout)
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Return the response that completed the future, waiting up to timeout seconds."""
+        if not self.wait(timeout):
+            raise RuntimeError('Desired state not reached within %s s' % timeout)
+        return self._response
+
+    def cancel(self):
+        """Stop waiting: drop the monitor subscription so the future never completes (call after a wait() times out).
+
+        Returns:
+            cancelled (bool): False if the future had already completed
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self._cancelled = True
+            cancel_fn, self._cancel_fn = self._cancel_fn, None
+        if cancel_fn is not None:
+            cancel_fn()
+        return True
+
+    def add_done_callback(self, fn):
+        """Call fn(future) once done (immediately if already done)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _set_result(self, response):
+        with self._lock:
+            if self._event.is_set() or self._cancelled:
+                return
+            self._response = response
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class PathwayMonitor(object):
+
+    """
+    PathwayMonitor polls a Pathway for STATUS in a background thread and keeps the latest state in memory, so the experiment loop can check device readiness without waiting on the network.
+
+    Callbacks and futures are completed from the monitor thread, so they should be quick and must not draw.
+
+    Args:
+        pathway (Pathway): device to poll; a pathway created with reuse_socket=True avoids a new connection per poll
+        poll_interval (float): seconds between STATUS polls; default .1s
+
+    """
+
+    def __init__(self, pathway, poll_interval=.1):
+        self.pathway = pathway
+        self.poll_interval = poll_interval
+        self.response = None # latest STATUS response
+        self.last_update = None # time.time() of the latest response
+        self.last_poll = None # time.time() the latest response's STATUS request was sent
+        self.errors = 0 # number of polls that failed
+        self._subscribers = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """Whether the polling thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pathway_state(self):
+        """Latest pathway_state, or None before the first response."""
+        response = self.response
+        return response['pathway_state'] if response else None
+
+    @property
+    def test_state(self):
+        """Latest test_state, or None before the first response."""
+        response = self.response
+        return response['test_state'] if response else None
+
+    def is_state(self, to_watch, desired_value):
+        """Whether the latest response has desired_value in field to_watch."""
+        response = self.response
+        return bool(response) and response[to_watch] == desired_value
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='PathwayMonitor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling and wait for the thread to finish."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def subscribe(self, callback, to_watch=None, desired_value=None):
+        """
+        Register a callback for state changes.
+
+        Args:
+            callback (function): called as callback(response, previous) from the monitor thread; previous is None for the first response
+            to_watch (str): only call back when this field changes; default None (any change of pathway_state or test_state)
+            desired_value (str): only call back when to_watch changes to this value; default None (any value)
+
+        Returns:
+            token (int): pass to unsubscribe to remove the callback
+        """
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (callback, to_watch, desired_value, None)
+        return token
+
+    def unsubscribe(self, token):
+        """Remove a callback registered with subscribe."""
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def wait_for(self, to_watch, desired_value, after=None):
+        """
+        Get a future that completes once to_watch has desired_value (immediately if it already does).
+
+        Args:
+            to_watch (str): the response field to monitor; most often 'test_state' or 'pathway_state'
+            desired_value (str): the value to wait for
+            after (float): only accept responses to polls sent after this time.time(), e.g. the reply to a command that
+                changes the state; the cached response is ignored if it is older, and a matching value counts even if it
+                didn't change. Default None (accept the cached response, then wait for a change to desired_value)
+
+        Returns:
+            future (StateFuture): completes with the matching response
+        """
+        future = StateFuture()
+        with self._lock:
+            response = self.response
+            if response and response[to_watch] == desired_value and (after is None or self.last_poll > after):
+                future._set_result(response)
+                return future
+            token = self._next_token
+            self._next_token += 1
+            def _resolve(response, previous):
+                self.unsubscribe(token)
+                future._set_result(response)
+            self._subscribers[token] = (_resolve, to_watch, desired_value, after)
+            future._cancel_fn = lambda: self.unsubscribe(token)
+        return future
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            t_poll = time.time()
+            try:
+                response = self.pathway.call('STATUS', verbose=False)
+            except (socket.error, IOError):
+                self.errors += 1
+                response = None
+            if response:
+                self._update(response, t_poll)
+            self._stop_event.wait(max(0., self.poll_interval - (time.time() - t_poll)))
+
+    def _update(self, response, t_poll=None):
+        with self._lock:
+            previous = self.response
+            self.response = response
+            self.last_update = time.time()
+            self.last_poll = t_poll if t_poll is not None else self.last_update
+            subscribers = list(self._subscribers.values())
+        for callback, to_watch, desired_value, after in subscribers:
+            if after is not None:
+                # wait_for(after=...): any fresh response with the desired value, changed or not
+                if self.last_poll > after and response[to_watch] == desired_value:
+                    callback(response, previous)
+                continue
+            if to_watch is None:
+                changed = previous is None or previous['pathway_state'] != response['pathway_state'] or previous['test_state'] != response['test_state']
+            else:
+                changed = previous is None or previous[to_watch] != response[to_watch]
+            if not changed:
+                continue
+            if desired_value is not None and response[to_watch] != desired_value:
+                continue
+            callback(response, previous)
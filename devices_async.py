@@ -0,0 +1,254 @@
+"""
+Asyncio Pathway Device Class
+============================
+
+Python 3 only counterpart to devices.Pathway. Commands are encoded and responses
+decoded by the same devices.PathwayCodec as Pathway, but every call is a coroutine,
+so heat commands can be awaited alongside other work instead of blocking the caller.
+It is not a Pathway: the blocking parts (e.g. start_monitor) have no counterpart here.
+
+PsychoPy frame loops are not coroutines, so BackgroundLoop runs an event loop in a
+worker thread and hands back concurrent.futures.Future objects the frame loop can
+check without waiting, e.g.::
+
+    loop = BackgroundLoop()
+    pathway = AsyncPathway(ip='10.150.254.8', port_number=20121)
+    loop.submit(pathway.connect()).result()
+    future = loop.submit(pathway.program(protocol))
+    ...
+    if future.done():
+        response = future.result()
+"""
+
+__all__ = ['AsyncPathway', 'BackgroundLoop']
+__license__ = "MIT"
+import asyncio
+import struct
+import threading
+from devices import IDEMPOTENT_COMMANDS, PathwayCodec
+
+
+class AsyncPathway(PathwayCodec):
+
+    """
+    AsyncPathway is an asyncio client for the Medoc Pathway thermal stimulation machine.
+
+    Unlike Pathway, creating one does not contact the device; await connect() for that.
+
+    Args:
+        ip (str): device ip address
+        port_number (int): port the device is listening on
+        timeout (float): seconds until a call times out; default 5s
+        verbose (bool): flag whether to print responses; default True
+        reuse_socket (bool): keep one long-lived connection open and reuse it for every call; default True
+        max_reconnects (int): how many times a failed STATUS call on a reused connection reconnects and resends; other
+            commands reconnect and re-raise the error instead, since the device may have executed them; default 1
+
+    """
+
+    def __init__(self, ip, port_number, timeout=5., verbose=True, reuse_socket=True, max_reconnects=1):
+        super(AsyncPathway, self).__init__()
+        assert isinstance(ip, str), "IP address must be a string."
+        assert isinstance(port_number, int), "Port must be an integer"
+
+        self.ip = ip
+        self.port_number = port_number
+        self.timeout = timeout
+        self.verbose = verbose
+        self.reuse_socket = reuse_socket
+        self.max_reconnects = max_reconnects
+        self.reconnects = 0 # number of times the long-lived connection had to be re-established
+        self._reader = None
+        self._writer = None
+        self._lock = None
+
+    async def connect(self):
+        """Issue a STATUS call to make sure the device is reachable."""
+        try:
+            await self.call('STATUS', verbose=False)
+            print('Connection to Pathway successful')
+        except (OSError, asyncio.TimeoutError):
+            raise IOError('Cannot establish connection, check IP and port number is correct and the host computer is on.')
+
+    async def _open_connection(self):
+        """Open and return a new (reader, writer) stream pair"""
+        return await asyncio.open_connection(self.ip, self.port_number)
+
+    async def close(self):
+        """Close the long-lived connection, if there is one."""
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = None
+            self._writer = None
+
+    async def _exchange(self, reader, writer, MESSAGE):
+        """Send a formatted message and return (data, nbytes) once the whole response has arrived."""
+        writer.write(MESSAGE)
+        await writer.drain()
+        start, stop = self.segmentation_points['LENGTH_OFFSET']
+        header = await reader.readexactly(stop - start)
+        length = struct.unpack('<I', header)[0]
+        data = header + await reader.readexactly(length)
+        return data, len(MESSAGE)
+
+    async def _send_and_receive(self, MESSAGE, reuse_socket, resend=False):
+        """Send a message over the long-lived or a fresh connection, within the timeout (resend: retry it after a reconnect)."""
+        if not reuse_socket:
+            reader, writer = await asyncio.wait_for(self._open_connection(), self.timeout)
+            try:
+                return await asyncio.wait_for(self._exchange(reader, writer, MESSAGE), self.timeout)
+            finally:
+                writer.close()
+
+        # A dropped connection only shows up when we use it, so reconnect (and resend, if that's safe)
+        attempt = 0
+        while True:
+            try:
+                if self._writer is None:
+                    self._reader, self._writer = await asyncio.wait_for(self._open_connection(), self.timeout)
+                return await asyncio.wait_for(self._exchange(self._reader, self._writer, MESSAGE), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                await self.close()
+                if not resend or attempt >= self.max_reconnects:
+                    raise
+                attempt += 1
+                self.reconnects += 1
+
+    async def call(self, command, protocol=None, reuse_socket=None, verbose=None):
+        """
+        Send command to device.
+
+        Args:
+            command (str/int): command name or command_id number to send to device
+            protocol (str/int): protocol number on device to issue command to (only needed for command TEST_PROGRAM)
+            reuse_socket (bool): send over the long-lived connection instead of opening a new one; default None (use the value given at construction)
+            verbose (bool): whether to print out the device callback; default None (use the value given at construction)
+
+        Returns:
+            response (PathwayResponse): response from Medoc system
+        """
+        if reuse_socket is None:
+            reuse_socket = self.reuse_socket
+
+        command = self._command_id(command)
+
+        if command == 1 and protocol is None:
+            raise ValueError('TEST_PROGRAM command requires a protocol number')
+
+        MESSAGE = self._format_command(command, protocol)
+        # one command in flight at a time, the device answers in order
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            data, nbytes = await self._send_and_receive(MESSAGE, reuse_socket, resend=command in IDEMPOTENT_COMMANDS)
+        response = self._format_response(data, nbytes)
+        if not response and command in IDEMPOTENT_COMMANDS:
+            return await self.call(command, protocol, reuse_socket=reuse_socket, verbose=verbose)
+        if verbose is None:
+            verbose = self.verbose
+        if verbose:
+            print(response)
+        return response
+
+    async def poll_for_change(self, to_watch, desired_value, poll_interval=.5, poll_max=-1, verbose=False, server_lag=1., reuse_socket=None):
+        """
+        Poll system for a value change without blocking the event loop. See Pathway.poll_for_change.
+
+        Args:
+            to_watch (str): the response field we should be monitoring; most often 'test_state' or 'pathway_state'
+            desired_value (str): the desired value of the field to wait on
+            poll_interval (float): how often to poll; default .5s
+            poll_max (int): upper limit on polling attempts; default -1 (unlimited)
+            verbose (bool): print poll attempt number and current state
+            server_lag (float): extra delay before returning, so the next command isn't missed; default 1s
+            reuse_socket (bool): poll over the long-lived connection; default None (use the value given at construction)
+
+        Returns:
+            status (bool): whether desired_value was achieved
+
+        """
+        val = ''
+        count = 1
+        while val != desired_value:
+            if verbose:
+                print("Poll: {}".format(str(count)))
+            resp = await self.call('STATUS', reuse_socket=reuse_socket)
+            if resp:
+                val = resp[to_watch]
+            else:
+                val = 'RESPONSE_FORMAT_ERROR'
+            if verbose:
+                print("Current value: {}".format(val))
+            if val == desired_value:
+                break
+            await asyncio.sleep(poll_interval)
+            count += 1
+            if poll_max > 0 and count > poll_max:
+                print("Polling limit exceeded")
+                return False
+        await asyncio.sleep(server_lag)
+        return True
+
+    #Convenience wrappers around call method
+
+    async def status(self):
+        """ Convenience method."""
+        return await self.call('STATUS')
+
+    async def program(self, protocol):
+        """ Convenience method."""
+        return await self.call('TEST_PROGRAM', protocol=protocol)
+
+    async def start(self):
+        """ Convenience method."""
+        return await self.call('START')
+
+    async def pause(self):
+        """ Convenience method."""
+        return await self.call('PAUSE')
+
+    async def trigger(self):
+        """ Convenience method."""
+        return await self.call('TRIGGER')
+
+    async def stop(self):
+        """ Convenience method."""
+        return await self.call('STOP')
+
+    async def abort(self):
+        """ Convenience method."""
+        return await self.call('ABORT')
+
+    async def yes(self):
+        """ Convenience method."""
+        return await self.call('YES')
+
+    async def no(self):
+        """ Convenience method."""
+        return await self.call('NO')
+
+
+class BackgroundLoop(object):
+
+    """
+    Runs an asyncio event loop in a daemon thread so synchronous code (e.g. a PsychoPy frame loop) can schedule coroutines without waiting on them.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name='PathwayLoop')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        """Stop the loop and wait for its thread to finish."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,272 @@
+from __future__ import division
+
+"""
+Pathway Simulator
+=================
+
+Local TCP stand-in for the Medoc Pathway server, for testing and benchmarking devices.Pathway without the thermode.
+It speaks the same framing as Pathway._format_command/_format_response and implements the IDLE/READY/TEST state machine.
+
+Run standalone with ``python devices_simulator.py --port 20121`` or use it in-process::
+
+    with PathwaySimulator(latency=.002) as sim:
+        pathway = Pathway(sim.ip, sim.port_number, reuse_socket=True)
+"""
+
+__all__ = ['PathwaySimulator']
+__license__ = "MIT"
+import random
+import socket
+import struct
+import threading
+import time
+from six.moves import socketserver
+from devices import (COMMAND_CODES, COMMAND_HEADER, PROTOCOL_FIELD, RESPONSE_HEADER, RESPONSE_CODES,
+                     STATE_CODES, TEST_STATES)
+
+def _code(table, name):
+    """Look up the numeric code for a name in one of the devices code tables."""
+    for code, value in table.items():
+        if value == name:
+            return code
+    raise KeyError(name)
+
+IDLE, READY, TEST = [_code(STATE_CODES, name) for name in ('IDLE', 'READY', 'TEST')]
+TEST_IDLE, TEST_RUNNING, TEST_PAUSED, TEST_READY = [_code(TEST_STATES, name) for name in ('IDLE', 'RUNNING', 'PAUSED', 'READY')]
+RESULT_OK, RESULT_ILLEGAL_ARG, RESULT_ILLEGAL_STATE, RESULT_ILLEGAL_TEST_STATE, RESULT_DEVICE_COMM_ERROR = [
+    _code(RESPONSE_CODES, name) for name in ('RESULT_OK', 'RESULT_ILLEGAL_ARG', 'RESULT_ILLEGAL_STATE',
+                                             'RESULT_ILLEGAL_TEST_STATE', 'RESULT_DEVICE_COMM_ERROR')]
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.simulator.connections += 1
+
+    def _recv_exactly(self, n):
+        chunks = []
+        while n > 0:
+            chunk = self.request.recv(n)
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b''.join(chunks)
+
+    def handle(self):
+        simulator = self.server.simulator
+        # keep answering until the client hangs up, so both per-call and reused connections work
+        while True:
+            header = self._recv_exactly(4)
+            if header is None:
+                return
+            body = self._recv_exactly(struct.unpack('<I', header)[0])
+            if body is None:
+                return
+            reply, close = simulator._handle_message(header + body)
+            if reply:
+                self.request.sendall(reply)
+            if close:
+                return
+
+
+class PathwaySimulator(object):
+
+    """
+    PathwaySimulator is a local TCP server that behaves like the Medoc Pathway.
+
+    State machine: TEST_PROGRAM selects a protocol (IDLE -> READY), START begins the test (READY -> TEST, test RUNNING for
+    start_delay seconds, then test READY), TRIGGER runs the stimulus (test RUNNING for stimulus_duration seconds, then back to
+    READY/IDLE), PAUSE/START pause and resume, STOP ends the test (-> READY) and ABORT resets everything (-> IDLE).
+    Commands that are not allowed in the current state get RESULT_ILLEGAL_STATE or RESULT_ILLEGAL_TEST_STATE.
+
+    Args:
+        ip (str): address to listen on; default '127.0.0.1'
+        port_number (int): port to listen on; default 0 (any free port, see port_number after start)
+        latency (float): seconds before every response; default 0
+        jitter (float): extra delay drawn uniformly from [0, jitter) seconds; default 0
+        drop_rate (float): probability that a command's connection is closed without a response; default 0
+        truncate_rate (float): probability that only part of a response is sent before the connection is closed; default 0
+        error_rate (float): probability that a command is answered with RESULT_DEVICE_COMM_ERROR; default 0
+        close_after_response (bool): close the connection after every response instead of keeping it open; default False
+        start_delay (float): seconds from START until the device is ready for TRIGGER; default 0
+        stimulus_duration (float): seconds a triggered stimulus runs; default 0
+        seed (int): seed for the fault injection and jitter random number generator; default None
+
+    """
+
+    def __init__(self, ip='127.0.0.1', port_number=0, latency=0., jitter=0., drop_rate=0., truncate_rate=0., error_rate=0.,
+                 close_after_response=False, start_delay=0., stimulus_duration=0., seed=None):
+        self.ip = ip
+        self.port_number = port_number
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.truncate_rate = truncate_rate
+        self.error_rate = error_rate
+        self.close_after_response = close_after_response
+        self.start_delay = start_delay
+        self.stimulus_duration = stimulus_duration
+        self.connections = 0 # connections accepted
+        self.commands = 0 # commands received
+        self.faults = 0 # commands dropped, truncated or answered with an error
+        self.protocol = None
+        self.pathway_state = IDLE
+        self.test_state = TEST_IDLE
+        self._transition = None # (time.time() at which the timed state ends, pathway_state, test_state)
+        self._paused_remaining = 0. # seconds left of the timed state when it was paused
+        self._t0 = time.time()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Start serving in a daemon thread."""
+        self._server = _Server((self.ip, self.port_number), _Handler)
+        self._server.simulator = self
+        self.port_number = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='PathwaySimulator')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _set_timed(self, pathway_state, test_state, duration, then_pathway_state, then_test_state):
+        """Enter a state that lasts duration seconds and then changes on its own."""
+        self.pathway_state, self.test_state = pathway_state, test_state
+        self._transition = (time.time() + duration, then_pathway_state, then_test_state)
+
+    def _advance(self):
+        """Apply a timed state change whose time has come."""
+        if self._transition is not None and time.time() >= self._transition[0]:
+            _, self.pathway_state, self.test_state = self._transition
+            self._transition = None
+
+    def _execute(self, command, protocol):
+        """Run one command against the state machine and return its result code."""
+        self._advance()
+        name = COMMAND_CODES.get(command)
+        if name in ('STATUS', 'YES', 'NO'):
+            return RESULT_OK
+        if name == 'TEST_PROGRAM':
+            if not protocol:
+                return RESULT_ILLEGAL_ARG
+            if self.pathway_state == TEST:
+                return RESULT_ILLEGAL_STATE
+            self.protocol = protocol
+            self.pathway_state, self.test_state = READY, TEST_IDLE
+            return RESULT_OK
+        if name == 'START':
+            if self.pathway_state == TEST and self.test_state == TEST_PAUSED:
+                remaining = self._paused_remaining
+                self._set_timed(TEST, TEST_RUNNING, remaining, READY, TEST_IDLE)
+                return RESULT_OK
+            if self.pathway_state != READY:
+                return RESULT_ILLEGAL_STATE
+            self._set_timed(TEST, TEST_RUNNING, self.start_delay, TEST, TEST_READY)
+            return RESULT_OK
+        if name == 'TRIGGER':
+            if self.pathway_state != TEST:
+                return RESULT_ILLEGAL_STATE
+            if self.test_state != TEST_READY:
+                return RESULT_ILLEGAL_TEST_STATE
+            self._set_timed(TEST, TEST_RUNNING, self.stimulus_duration, READY, TEST_IDLE)
+            return RESULT_OK
+        if name == 'PAUSE':
+            if self.pathway_state != TEST:
+                return RESULT_ILLEGAL_STATE
+            if self.test_state != TEST_RUNNING or self._transition is None:
+                return RESULT_ILLEGAL_TEST_STATE
+            self._paused_remaining = max(0., self._transition[0] - time.time())
+            self._transition = None
+            self.test_state = TEST_PAUSED
+            return RESULT_OK
+        if name == 'STOP':
+            if self.pathway_state != TEST:
+                return RESULT_ILLEGAL_STATE
+            self._transition = None
+            self.pathway_state, self.test_state = READY, TEST_IDLE
+            return RESULT_OK
+        if name == 'ABORT':
+            self._transition = None
+            self.protocol = None
+            self.pathway_state, self.test_state = IDLE, TEST_IDLE
+            return RESULT_OK
+        return RESULT_ILLEGAL_ARG
+
+    def _handle_message(self, message):
+        """Decode a command message, run it and return (encoded response, whether to close the connection afterwards)."""
+        _, _, command = COMMAND_HEADER.unpack_from(message)
+        protocol = None
+        if len(message) >= COMMAND_HEADER.size + PROTOCOL_FIELD.size:
+            protocol = PROTOCOL_FIELD.unpack_from(message, COMMAND_HEADER.size)[0]
+
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            self.commands += 1
+            fault = self._random.random()
+            if fault < self.drop_rate:
+                self.faults += 1
+                return None, True
+            if fault < self.drop_rate + self.error_rate:
+                self.faults += 1
+                result = RESULT_DEVICE_COMM_ERROR
+            else:
+                result = self._execute(command, protocol)
+            test_time = int((time.time() - self._t0) * 1000)
+            reply = RESPONSE_HEADER.pack(RESPONSE_HEADER.size - 4, int(time.time()), command,
+                                         self.pathway_state, self.test_state, result, test_time)
+            if self._random.random() < self.truncate_rate:
+                self.faults += 1
+                return reply[:self._random.randint(1, len(reply) - 1)], True
+        return reply, self.close_after_response
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve a simulated Medoc Pathway.')
+    parser.add_argument('--ip', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=20121)
+    parser.add_argument('--latency', type=float, default=0.)
+    parser.add_argument('--jitter', type=float, default=0.)
+    parser.add_argument('--drop-rate', type=float, default=0.)
+    parser.add_argument('--truncate-rate', type=float, default=0.)
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--start-delay', type=float, default=0.)
+    parser.add_argument('--stimulus-duration', type=float, default=0.)
+    parser.add_argument('--close-after-response', action='store_true')
+    args = parser.parse_args()
+    simulator = PathwaySimulator(args.ip, args.port, latency=args.latency, jitter=args.jitter, drop_rate=args.drop_rate,
+                                 truncate_rate=args.truncate_rate, error_rate=args.error_rate,
+                                 close_after_response=args.close_after_response, start_delay=args.start_delay,
+                                 stimulus_duration=args.stimulus_duration)
+    simulator.start()
+    print('Simulated Pathway listening on %s:%d' % (simulator.ip, simulator.port_number))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()